@@ -1,11 +1,28 @@
 import pandas as pd
 import sqlite3
+import matplotlib
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import os
 import time
 import platform
 import requests
 import io
+import json
+import re
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from openpyxl import load_workbook
+
+# --- 列指向キャッシュ用（pyarrowがなければpickleで代用） ---
+try:
+    import pyarrow  # noqa: F401  (to_feather / read_feather が使う)
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
 
 # --- フォント設定 ---
 system_name = platform.system()
@@ -16,161 +33,575 @@ elif system_name == 'Windows': # Windows
 else:
     plt.rcParams['font.family'] = 'sans-serif'
 
+# --- 都道府県と地方の対応（バックアップ・名寄せの基準） ---
+PREFECTURE_REGIONS = {
+    "北海道": "北海道", "青森": "東北", "岩手": "東北", "宮城": "東北", "秋田": "東北", "山形": "東北", "福島": "東北",
+    "茨城": "関東", "栃木": "関東", "群馬": "関東", "埼玉": "関東", "千葉": "関東", "東京": "関東", "神奈川": "関東",
+    "新潟": "中部", "富山": "中部", "石川": "中部", "福井": "中部", "山梨": "中部", "長野": "中部", "岐阜": "中部", "静岡": "中部", "愛知": "中部",
+    "三重": "近畿", "滋賀": "近畿", "京都": "近畿", "大阪": "近畿", "兵庫": "近畿", "奈良": "近畿", "和歌山": "近畿",
+    "鳥取": "中国", "島根": "中国", "岡山": "中国", "広島": "中国", "山口": "中国",
+    "徳島": "四国", "香川": "四国", "愛媛": "四国", "高知": "四国",
+    "福岡": "九州", "佐賀": "九州", "長崎": "九州", "熊本": "九州", "大分": "九州", "宮崎": "九州", "鹿児島": "九州", "沖縄": "九州"
+}
+
+class NameNormalizer:
+    """都道府県名の名寄せ（列まとめて処理し、同じ名前は1回だけ変換する）"""
+    # 全角スペース・半角スペース・改行などを1回で消す変換表
+    WHITESPACE_TABLE = str.maketrans("", "", "　 \n\r\t")
+    # 末尾の「都・道・府・県」だけを対象にする
+    SUFFIX_PATTERN = re.compile(r"[都道府県]$")
+
+    def __init__(self, suffix_only=True):
+        # suffix_only=False にすると、従来通り名前中の「都道府県」を全て消す
+        self.suffix_only = suffix_only
+        self.canonical_names = set(PREFECTURE_REGIONS)
+        self.memo = {}
+
+    def canonical(self, name):
+        """空白を除いた名前1つを正規名にする（結果は覚えておく）"""
+        if name in self.memo:
+            return self.memo[name]
+
+        if name in self.canonical_names:
+            # 「北海道」「京都」などは既に正規名なので削らない
+            result = name
+        elif self.suffix_only:
+            result = self.SUFFIX_PATTERN.sub("", name)
+        else:
+            result = name.replace("都", "").replace("道", "").replace("府", "").replace("県", "")
+
+        self.memo[name] = result
+        return result
+
+    def normalize(self, series):
+        """Seriesをまとめて正規化する"""
+        # 空白の除去は .str 操作で列ごと一度に行う
+        cleaned = series.fillna("").astype(str).str.translate(self.WHITESPACE_TABLE).str.strip()
+        # 数万行あってもユニークな名前は少ないので、変換はユニーク値だけで済ませる
+        mapping = {name: self.canonical(name) for name in cleaned.unique()}
+        return cleaned.map(mapping)
+
 class RegionScraper:
-    def __init__(self):
+    # 都道府県と地方の対応はほとんど変わらないので、取得結果をしばらく使い回す
+    CACHE_TTL = 30 * 24 * 60 * 60  # 30日（秒）
+
+    def __init__(self, cache_path=os.path.join(".region_cache", "regions.json"), ttl=CACHE_TTL):
         self.url = "https://ja.wikipedia.org/wiki/%E9%83%BD%E9%81%93%E5%BA%9C%E7%9C%8C"
         # バックアップデータ（万が一のため）
-        self.backup_data = {
-            "北海道": "北海道", "青森": "東北", "岩手": "東北", "宮城": "東北", "秋田": "東北", "山形": "東北", "福島": "東北",
-            "茨城": "関東", "栃木": "関東", "群馬": "関東", "埼玉": "関東", "千葉": "関東", "東京": "関東", "神奈川": "関東",
-            "新潟": "中部", "富山": "中部", "石川": "中部", "福井": "中部", "山梨": "中部", "長野": "中部", "岐阜": "中部", "静岡": "中部", "愛知": "中部",
-            "三重": "近畿", "滋賀": "近畿", "京都": "近畿", "大阪": "近畿", "兵庫": "近畿", "奈良": "近畿", "和歌山": "近畿",
-            "鳥取": "中国", "島根": "中国", "岡山": "中国", "広島": "中国", "山口": "中国",
-            "徳島": "四国", "香川": "四国", "愛媛": "四国", "高知": "四国",
-            "福岡": "九州", "佐賀": "九州", "長崎": "九州", "熊本": "九州", "大分": "九州", "宮崎": "九州", "鹿児島": "九州", "沖縄": "九州"
-        }
+        self.backup_data = dict(PREFECTURE_REGIONS)
+        self.cache_path = cache_path
+        self.ttl = ttl
+
+    def load_cache(self):
+        """保存済みの {fetched_at, etag, last_modified, rows} を返す（なければNone）"""
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_cache(self, entry):
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+
+    def cached_frame(self, entry):
+        return pd.DataFrame(entry['rows'], columns=['prefecture', 'region'])
+
+    def parse_table(self, html):
+        """ページ内の表から (prefecture, region) の表を探す"""
+        dfs = pd.read_html(io.StringIO(html))
+        
+        target_df = None
+        pref_col_idx = -1
+        region_col_idx = -1
+
+        for df in dfs:
+            df_str = df.astype(str)
+            if len(df) < 40: continue
+
+            for i in range(len(df.columns)):
+                col_values = df_str.iloc[:, i].tolist()
+                if any("北海道" in v for v in col_values):
+                    pref_col_idx = i
+                if any("東北" in v for v in col_values) and any("関東" in v for v in col_values):
+                    region_col_idx = i
+            
+            if pref_col_idx != -1 and region_col_idx != -1:
+                target_df = df
+                break
+
+        if target_df is None:
+            raise Exception("テーブルが見つかりません")
+
+        result = target_df.iloc[:, [pref_col_idx, region_col_idx]].copy()
+        result.columns = ['prefecture', 'region']
+        # 余計な文字を削除
+        result['prefecture'] = result['prefecture'].astype(str).str.replace(r'\[.*?\]', '', regex=True)
+        return result[result['prefecture'].str.contains("都|道|府|県")]
 
     def scrape(self):
+        entry = self.load_cache()
+
+        # 1. 期限内のキャッシュがあれば通信しない（待ち時間もなし）
+        if entry is not None and time.time() - entry.get('fetched_at', 0) < self.ttl:
+            print(f" >> キャッシュから地方データを読み込み: {self.cache_path}")
+            return self.cached_frame(entry)
+
+        # 2. 期限切れ(または未取得)なら条件付きGETで更新を確認する
         print(f"Webサイトからデータを取得中...: {self.url}")
-        time.sleep(2) 
+        time.sleep(2)  # 実際にアクセスするときだけ間隔をあける
         
         try:
             headers = {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
             }
-            response = requests.get(self.url, headers=headers)
+            if entry is not None:
+                if entry.get('etag'):
+                    headers["If-None-Match"] = entry['etag']
+                if entry.get('last_modified'):
+                    headers["If-Modified-Since"] = entry['last_modified']
+            response = requests.get(self.url, headers=headers, timeout=10)
+
+            if response.status_code == 304 and entry is not None:
+                # ページは変わっていないので、保存済みの表をそのまま使う
+                entry['fetched_at'] = time.time()
+                self.save_cache(entry)
+                print(" >> 更新なし。キャッシュのデータを使用します。")
+                return self.cached_frame(entry)
             response.raise_for_status()
             
-            dfs = pd.read_html(io.StringIO(response.text))
-            
-            target_df = None
-            pref_col_idx = -1
-            region_col_idx = -1
-
-            for df in dfs:
-                df_str = df.astype(str)
-                if len(df) < 40: continue
-
-                for i in range(len(df.columns)):
-                    col_values = df_str.iloc[:, i].tolist()
-                    if any("北海道" in v for v in col_values):
-                        pref_col_idx = i
-                    if any("東北" in v for v in col_values) and any("関東" in v for v in col_values):
-                        region_col_idx = i
-                
-                if pref_col_idx != -1 and region_col_idx != -1:
-                    target_df = df
-                    break
-
-            if target_df is not None:
-                result = target_df.iloc[:, [pref_col_idx, region_col_idx]].copy()
-                result.columns = ['prefecture', 'region']
-                # 余計な文字を削除
-                result['prefecture'] = result['prefecture'].astype(str).str.replace(r'\[.*?\]', '', regex=True)
-                result = result[result['prefecture'].str.contains("都|道|府|県")]
-                print(" >> スクレイピング成功！ Webデータを使用します。")
-                return result
-            
-            raise Exception("テーブルが見つかりません")
+            result = self.parse_table(response.text)
+            self.save_cache({
+                'fetched_at': time.time(),
+                'etag': response.headers.get("ETag"),
+                'last_modified': response.headers.get("Last-Modified"),
+                'rows': result.values.tolist(),
+            })
+            print(" >> スクレイピング成功！ Webデータを使用します。")
+            return result
             
         except Exception as e:
+            if entry is not None:
+                print(f"警告: スクレイピング失敗 ({e})。期限切れのキャッシュを使用します。")
+                return self.cached_frame(entry)
             print(f"警告: スクレイピング失敗 ({e})。バックアップを使用します。")
             # バックアップデータ使用時は「県」などを抜いたキーで作成
             return pd.DataFrame(list(self.backup_data.items()), columns=['prefecture', 'region'])
 
+class ExcelCache:
+    """Excelの読み込み結果を、ファイル内容のハッシュをキーに列指向形式で保存する"""
+    # 読み込み・整形の処理を変えたときはここを上げて古いキャッシュを使わないようにする
+    VERSION = 2
+
+    def __init__(self, cache_dir=".excel_cache"):
+        self.cache_dir = cache_dir
+        self.ext = ".feather" if HAS_PYARROW else ".pkl"
+
+    def file_hash(self, path):
+        """ファイル内容のSHA-256（ファイル名や更新日時が変わっても中身が同じなら同じ値）"""
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def fingerprint(self, path, kind):
+        """ファイル内容と読み込み処理の版から作る指紋"""
+        return f"{kind}_v{self.VERSION}_{self.file_hash(path)[:16]}"
+
+    def path_for(self, path, kind):
+        return os.path.join(self.cache_dir, self.fingerprint(path, kind) + self.ext)
+
+    def load(self, path, kind, reader):
+        """キャッシュがあればそれを、なければ reader(path) の結果を保存して返す"""
+        cache_path = self.path_for(path, kind)
+        if os.path.exists(cache_path):
+            print(f" >> キャッシュから読み込み: {os.path.basename(path)}")
+            if HAS_PYARROW:
+                return pd.read_feather(cache_path)
+            return pd.read_pickle(cache_path)
+
+        df = reader(path).reset_index(drop=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # 並列で同じファイルを書いても壊れないよう、一時ファイルに書いてから置き換える
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        if HAS_PYARROW:
+            df.to_feather(tmp_path)
+        else:
+            df.to_pickle(tmp_path)
+        os.replace(tmp_path, cache_path)
+        return df
+
+class ExcelColumnReader:
+    """openpyxlの読み取り専用モードで、必要な列だけを1行ずつ読む
+
+    シート全体をメモリに載せないので、大きなブックでも使用メモリは一定に近い。
+    1つのブックを開いたまま、シート探しと読み込みの両方に使える。
+    """
+    def __init__(self, path):
+        self.path = path
+        self.workbook = None
+
+    def __enter__(self):
+        self.workbook = load_workbook(self.path, read_only=True, data_only=True)
+        return self
+
+    def __exit__(self, *exc):
+        self.workbook.close()
+
+    @property
+    def sheet_names(self):
+        return self.workbook.sheetnames
+
+    def iter_rows(self, sheet_name, columns, first_row):
+        """first_row行目(1始まり)から、columns(0始まりの列番号)の値だけを返す"""
+        sheet = self.workbook[sheet_name]
+        max_col = max(columns) + 1
+        for row in sheet.iter_rows(min_row=first_row, max_col=max_col, values_only=True):
+            # 行末の空セルは省略されることがあるので、足りない列は None にする
+            yield tuple(row[c] if c < len(row) else None for c in columns)
+
+    def read_frame(self, sheet_name, columns, first_row, names):
+        """iter_rows の結果を DataFrame にする"""
+        return pd.DataFrame(self.iter_rows(sheet_name, columns, first_row), columns=names)
+
 class DataManager:
-    def __init__(self, db_name="final_analysis.db"):
+    # 型と主キーを宣言したテーブル定義
+    TABLE_SCHEMAS = {
+        'load_fingerprints': """
+            CREATE TABLE IF NOT EXISTS load_fingerprints (
+                table_name TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                loaded_at TEXT
+            )""",
+        'land_prices': """
+            CREATE TABLE IF NOT EXISTS land_prices (
+                prefecture TEXT PRIMARY KEY,
+                land_price REAL NOT NULL
+            )""",
+        'tax_revenue': """
+            CREATE TABLE IF NOT EXISTS tax_revenue (
+                prefecture TEXT PRIMARY KEY,
+                tax_revenue REAL NOT NULL
+            )""",
+        'regions': """
+            CREATE TABLE IF NOT EXISTS regions (
+                join_key TEXT PRIMARY KEY,
+                prefecture TEXT,
+                region TEXT
+            )""",
+        # 分析用に3表を結合しておいた表（入力が変わったときだけ作り直す）
+        'prefecture_metrics': """
+            CREATE TABLE IF NOT EXISTS prefecture_metrics (
+                prefecture TEXT PRIMARY KEY,
+                land_price REAL,
+                tax_revenue REAL,
+                region TEXT
+            )""",
+    }
+    # 結合キーの索引（主キーの索引に値も含め、結合時に表本体を読まずに済ませる）
+    INDEXES = [
+        "CREATE INDEX IF NOT EXISTS idx_land_prices_key ON land_prices (prefecture, land_price)",
+        "CREATE INDEX IF NOT EXISTS idx_tax_revenue_key ON tax_revenue (prefecture, tax_revenue)",
+        "CREATE INDEX IF NOT EXISTS idx_regions_key ON regions (join_key, region)",
+    ]
+    # 結合クエリ（join_keyを使用）。結果は prefecture_metrics に保存しておく
+    METRICS_QUERY = """
+        SELECT 
+            T1.prefecture, 
+            T1.land_price, 
+            T2.tax_revenue,
+            T3.region
+        FROM land_prices AS T1
+        JOIN tax_revenue AS T2 ON T1.prefecture = T2.prefecture
+        LEFT JOIN regions AS T3 ON T1.prefecture = T3.join_key
+    """
+    # テーブルごとの (主キー, 値の列)
+    TABLE_KEYS = {
+        'land_prices': ('prefecture', ['land_price']),
+        'tax_revenue': ('prefecture', ['tax_revenue']),
+        'regions': ('join_key', ['prefecture', 'region']),
+    }
+
+    def __init__(self, db_name="final_analysis.db", cache_dir=".excel_cache"):
         self.db_name = db_name
+        self.normalizer = NameNormalizer()
+        self.cache = ExcelCache(cache_dir)
 
     def clean_name(self, name):
-        """徹底的にゴミを取り除く"""
+        """徹底的にゴミを取り除く（1件用。列には normalizer.normalize を使う）"""
         if pd.isna(name): return ""
         # 全角スペース、半角スペース、改行を削除
-        name = str(name).replace("　", "").replace(" ", "").replace("\n", "").strip()
-        # 都・道・府・県 も削除して「名寄せ」しやすくする
-        name = name.replace("都", "").replace("道", "").replace("府", "").replace("県", "")
-        return name
+        name = str(name).translate(NameNormalizer.WHITESPACE_TABLE).strip()
+        # 末尾の 都・道・府・県 を削除して「名寄せ」しやすくする（北海道・京都などはそのまま）
+        return self.normalizer.canonical(name)
+
+    def read_land_prices(self, land_file):
+        """地価のExcelを読み込み、(prefecture, land_price) の表にする"""
+        # シート'22'の4行目(見出しの次の行)から、B列(都道府県)とW列(地価)だけを読む
+        with ExcelColumnReader(land_file) as reader:
+            df_land = reader.read_frame('22', [1, 22], 4, ['prefecture', 'land_price'])
+        # ここでnormalizerを使って「県」などを削除した純粋な名前だけにする
+        df_land['prefecture'] = self.normalizer.normalize(df_land['prefecture'])
+        df_land = df_land[df_land['prefecture'] != '全国合計']
+        df_land['land_price'] = pd.to_numeric(df_land['land_price'], errors='coerce')
+        return df_land.dropna()
+
+    def read_tax_revenue(self, tax_file):
+        """税収のExcelを読み込み、(prefecture, tax_revenue) の表にする"""
+        # 1つのブックでシート探しと読み込みを両方行う（ファイルを2回開かない）
+        with ExcelColumnReader(tax_file) as reader:
+            target_sheet = next((s for s in reader.sheet_names if 'その３' in s or 'Part3' in s), None)
+            if target_sheet is None:
+                raise ValueError("税収データシートなし")
+            # 10行目から、B列(都道府県)とI列(収納済額)だけを読む
+            df_tax = reader.read_frame(target_sheet, [1, 8], 10, ['prefecture', 'tax_revenue'])
+        df_tax['prefecture'] = self.normalizer.normalize(df_tax['prefecture'])
+        df_tax = df_tax[~df_tax['prefecture'].isin(['局引受分', '計', 'nan', ''])]
+        df_tax['tax_revenue'] = pd.to_numeric(df_tax['tax_revenue'], errors='coerce')
+        return df_tax.dropna()
+
+    def ensure_tables(self, conn):
+        """型と主キーを宣言したテーブルを用意する（to_sqlで作られた古い表は作り直す）"""
+        for table, ddl in self.TABLE_SCHEMAS.items():
+            columns = conn.execute(f"PRAGMA table_info({table})").fetchall()
+            if columns and not any(col[5] for col in columns):
+                # 主キーのない表（以前の if_exists='replace' で作られたもの）は捨てる
+                conn.execute(f"DROP TABLE {table}")
+                conn.execute("DELETE FROM load_fingerprints WHERE table_name = ?", (table,))
+            conn.execute(ddl)
+        for ddl in self.INDEXES:
+            conn.execute(ddl)
+        conn.commit()
+
+    def refresh_metrics(self, conn):
+        """prefecture_metrics を結合クエリの結果で作り直す（呼び出し側のトランザクション内で実行）"""
+        conn.execute("DELETE FROM prefecture_metrics")
+        conn.execute(f"INSERT OR REPLACE INTO prefecture_metrics (prefecture, land_price, tax_revenue, region) {self.METRICS_QUERY}")
+
+    def is_loaded(self, conn, table, fingerprint):
+        """前回と同じ内容のデータが既に入っているか"""
+        row = conn.execute("SELECT fingerprint FROM load_fingerprints WHERE table_name = ?", (table,)).fetchone()
+        return row is not None and row[0] == fingerprint
+
+    def frame_fingerprint(self, df):
+        """DataFrameの中身から指紋(ハッシュ)を作る"""
+        values = pd.util.hash_pandas_object(df, index=False).values
+        return hashlib.sha256(values.tobytes()).hexdigest()
+
+    def upsert_frame(self, conn, table, df):
+        """主キーで突き合わせ、値が変わった行だけを更新・追加し、消えた行を削除する"""
+        key, value_cols = self.TABLE_KEYS[table]
+        cols = [key] + value_cols
+        df = df.drop_duplicates(subset=key, keep='last')
+
+        placeholders = ", ".join("?" for _ in cols)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in value_cols)
+        changed = " OR ".join(f"{c} IS NOT excluded.{c}" for c in value_cols)
+        sql = (
+            f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({placeholders}) "
+            f"ON CONFLICT({key}) DO UPDATE SET {updates} WHERE {changed}"
+        )
+        # numpyの数値型はsqlite3が受け付けないので、Pythonの値に直してから渡す
+        conn.executemany(sql, df[cols].astype(object).itertuples(index=False, name=None))
+
+        existing = {row[0] for row in conn.execute(f"SELECT {key} FROM {table}")}
+        stale = existing - set(df[key])
+        conn.executemany(f"DELETE FROM {table} WHERE {key} = ?", [(k,) for k in stale])
 
     def process_excel_files(self, land_file, tax_file, df_region):
         conn = sqlite3.connect(self.db_name)
         print("\nExcelファイルの読み込みとDB保存を開始します...")
+        self.ensure_tables(conn)
+        loads = []  # 変更があった (テーブル名, DataFrame, 指紋)
 
-        # 1. 地価データ
+        # 1. 地価データ（前回と同じ内容のファイルなら読み込みごと省略）
         try:
-            df_land = pd.read_excel(land_file, sheet_name='22', header=2)
-            df_land = df_land.iloc[:, [1, 22]]
-            df_land.columns = ['prefecture', 'land_price']
-            # ここでclean_nameを使って「県」などを削除した純粋な名前だけにする
-            df_land['prefecture'] = df_land['prefecture'].apply(self.clean_name)
-            df_land = df_land[df_land['prefecture'] != '全国合計']
-            df_land['land_price'] = pd.to_numeric(df_land['land_price'], errors='coerce')
-            df_land.dropna().to_sql('land_prices', conn, if_exists='replace', index=False)
-            print(f" >> 地価データ保存完了")
+            fingerprint = self.cache.fingerprint(land_file, 'land')
+            if self.is_loaded(conn, 'land_prices', fingerprint):
+                print(" >> 地価データは変更なし（スキップ）")
+            else:
+                df_land = self.cache.load(land_file, 'land', self.read_land_prices)
+                loads.append(('land_prices', df_land, fingerprint))
         except Exception as e:
             print(f"【エラー】地価ファイル: {e}")
 
         # 2. 税収データ
         try:
-            xls = pd.ExcelFile(tax_file)
-            target_sheet = next((s for s in xls.sheet_names if 'その３' in s or 'Part3' in s), None)
-            if target_sheet:
-                df_tax = pd.read_excel(tax_file, sheet_name=target_sheet, header=None)
-                df_tax = df_tax.iloc[9:, [1, 8]]
-                df_tax.columns = ['prefecture', 'tax_revenue']
-                df_tax['prefecture'] = df_tax['prefecture'].apply(self.clean_name)
-                df_tax = df_tax[~df_tax['prefecture'].isin(['局引受分', '計', 'nan', ''])]
-                df_tax['tax_revenue'] = pd.to_numeric(df_tax['tax_revenue'], errors='coerce')
-                df_tax.dropna().to_sql('tax_revenue', conn, if_exists='replace', index=False)
-                print(f" >> 税収データ保存完了")
+            fingerprint = self.cache.fingerprint(tax_file, 'tax')
+            if self.is_loaded(conn, 'tax_revenue', fingerprint):
+                print(" >> 税収データは変更なし（スキップ）")
             else:
-                print("【エラー】税収データシートなし")
+                df_tax = self.cache.load(tax_file, 'tax', self.read_tax_revenue)
+                loads.append(('tax_revenue', df_tax, fingerprint))
         except Exception as e:
             print(f"【エラー】税収ファイル: {e}")
 
         # 3. 地方データ
         if df_region is not None:
             # Webデータも同じ基準でクリーニングする（これが重要！）
-            df_region['join_key'] = df_region['prefecture'].apply(self.clean_name)
-            df_region.to_sql('regions', conn, if_exists='replace', index=False)
-            print(" >> 地方データ保存完了")
+            df_region['join_key'] = self.normalizer.normalize(df_region['prefecture'])
+            fingerprint = self.frame_fingerprint(df_region[['prefecture', 'region', 'join_key']])
+            if self.is_loaded(conn, 'regions', fingerprint):
+                print(" >> 地方データは変更なし（スキップ）")
+            else:
+                loads.append(('regions', df_region, fingerprint))
+
+        # 4. 変更があった表だけ、まとめて1トランザクションで差分を書き込む
+        #    入力が変わったとき（または結合済みの表がまだ空のとき）だけ prefecture_metrics も作り直す
+        metrics_empty = conn.execute("SELECT COUNT(*) FROM prefecture_metrics").fetchone()[0] == 0
+        if loads or metrics_empty:
+            conn.execute("BEGIN")
+            try:
+                for table, df, fingerprint in loads:
+                    before = conn.total_changes
+                    self.upsert_frame(conn, table, df)
+                    conn.execute(
+                        "REPLACE INTO load_fingerprints (table_name, fingerprint, loaded_at) VALUES (?, ?, datetime('now'))",
+                        (table, fingerprint),
+                    )
+                    print(f" >> {table} 保存完了（{conn.total_changes - before - 1} 行を更新）")
+                self.refresh_metrics(conn)
+                print(" >> 分析用の結合表(prefecture_metrics)を更新")
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"【エラー】DB保存: {e}")
         
         conn.close()
 
+# --- 複数年度の一括取り込み ---
+# ファイル名から種類と年度(令和NN年)を判定する
+# 地価の表(シート22)が入っているのは allfile2 だけ。allfile1 なども受け付けると同じ年度の
+# land_prices_YYYY を取り合い、読み込みの終わる順で結果が変わってしまう
+LAND_FILE_PATTERN = re.compile(r"^r(\d{2})_xlsx_allfile2\.xlsx$")
+TAX_FILE_PATTERN = re.compile(r"^r(\d{2})_1001\.xlsx$")
+
+def classify_workbook(filename):
+    """ファイル名から ('land' or 'tax', 西暦年度) を返す。対象外なら None"""
+    for kind, pattern in (('land', LAND_FILE_PATTERN), ('tax', TAX_FILE_PATTERN)):
+        m = pattern.match(filename)
+        if m:
+            return kind, 2018 + int(m.group(1))  # 令和元年 = 2019年
+    return None
+
+def parse_workbook_job(path, kind, cache_dir):
+    """（別プロセスで実行）ブック1つを読み込んで整形済みの表を返す"""
+    started = time.perf_counter()
+    manager = DataManager(cache_dir=cache_dir)
+    reader = manager.read_land_prices if kind == 'land' else manager.read_tax_revenue
+    df = manager.cache.load(path, kind, reader)
+    return df, time.perf_counter() - started
+
+class BatchIngestor:
+    """rNN_*.xlsx が入ったフォルダを、年度ごとのテーブルにまとめて取り込む"""
+    VALUE_COLUMNS = {'land': ('land_prices', 'land_price'), 'tax': ('tax_revenue', 'tax_revenue')}
+
+    def __init__(self, db_name="final_analysis.db", cache_dir=".excel_cache", workers=None):
+        self.db_name = db_name
+        self.cache_dir = cache_dir
+        self.workers = workers
+
+    def find_workbooks(self, directory):
+        """フォルダ内の対象ファイルを (path, kind, year) の一覧にする"""
+        jobs = []
+        for filename in sorted(os.listdir(directory)):
+            info = classify_workbook(filename)
+            if info is None:
+                continue
+            kind, year = info
+            jobs.append((os.path.join(directory, filename), kind, year))
+        return jobs
+
+    def write_year_table(self, conn, kind, year, df):
+        """1ファイル分を1トランザクションで年度別テーブル (例: land_prices_2023) に入れる"""
+        base, value_col = self.VALUE_COLUMNS[kind]
+        table = f"{base}_{year}"
+        rows = [(year, p, v) for p, v in zip(df['prefecture'], df[value_col])]
+
+        conn.execute("BEGIN")
+        try:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (fiscal_year INTEGER, prefecture TEXT, {value_col} REAL)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_key ON {table} (prefecture, {value_col})")
+            conn.execute(f"DELETE FROM {table}")
+            conn.executemany(f"INSERT INTO {table} (fiscal_year, prefecture, {value_col}) VALUES (?, ?, ?)", rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return table
+
+    def refresh_views(self, conn):
+        """年度別テーブルを縦につないだビュー (land_prices_by_year など) を作り直す"""
+        tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for base, value_col in self.VALUE_COLUMNS.values():
+            year_tables = sorted(t for t in tables if re.fullmatch(rf"{base}_\d{{4}}", t))
+            conn.execute(f"DROP VIEW IF EXISTS {base}_by_year")
+            if year_tables:
+                union = " UNION ALL ".join(f"SELECT fiscal_year, prefecture, {value_col} FROM {t}" for t in year_tables)
+                conn.execute(f"CREATE VIEW {base}_by_year AS {union}")
+        conn.commit()
+
+    def run(self, directory):
+        jobs = self.find_workbooks(directory)
+        if not jobs:
+            print(f"エラー: {directory} に rNN_*.xlsx が見つかりません。")
+            return []
+
+        print(f"\n{len(jobs)} ファイルを並列で読み込みます...")
+        started = time.perf_counter()
+        conn = sqlite3.connect(self.db_name)
+        report = []
+
+        # 読み込み(openpyxl)はプロセスを分けて並列に、DBへの書き込みは届いた順に1本の接続で行う
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {
+                pool.submit(parse_workbook_job, path, kind, self.cache_dir): (path, kind, year)
+                for path, kind, year in jobs
+            }
+            for future in as_completed(futures):
+                path, kind, year = futures[future]
+                name = os.path.basename(path)
+                try:
+                    df, parse_sec = future.result()
+                    t0 = time.perf_counter()
+                    table = self.write_year_table(conn, kind, year, df)
+                    write_sec = time.perf_counter() - t0
+                    print(f" >> {name}: {table} に {len(df)} 行 (読込 {parse_sec:.2f}秒 / 書込 {write_sec:.3f}秒)")
+                    report.append((name, table, len(df), parse_sec, write_sec))
+                except Exception as e:
+                    print(f"【エラー】{name}: {e}")
+
+        self.refresh_views(conn)
+        conn.close()
+        print(f"一括取り込み完了: {len(report)}/{len(jobs)} ファイル, 合計 {time.perf_counter() - started:.2f}秒")
+        return report
+
 class Analyzer:
     def __init__(self, db_name="final_analysis.db"):
         self.db_name = db_name
         # 最終手段としてのバックアップマップ
-        self.region_map = {
-            "北海道": "北海道", "青森": "東北", "岩手": "東北", "宮城": "東北", "秋田": "東北", "山形": "東北", "福島": "東北",
-            "茨城": "関東", "栃木": "関東", "群馬": "関東", "埼玉": "関東", "千葉": "関東", "東京": "関東", "神奈川": "関東",
-            "新潟": "中部", "富山": "中部", "石川": "中部", "福井": "中部", "山梨": "中部", "長野": "中部", "岐阜": "中部", "静岡": "中部", "愛知": "中部",
-            "三重": "近畿", "滋賀": "近畿", "京都": "近畿", "大阪": "近畿", "兵庫": "近畿", "奈良": "近畿", "和歌山": "近畿",
-            "鳥取": "中国", "島根": "中国", "岡山": "中国", "広島": "中国", "山口": "中国",
-            "徳島": "四国", "香川": "四国", "愛媛": "四国", "高知": "四国",
-            "福岡": "九州", "佐賀": "九州", "長崎": "九州", "熊本": "九州", "大分": "九州", "宮崎": "九州", "鹿児島": "九州", "沖縄": "九州"
-        }
+        self.region_map = dict(PREFECTURE_REGIONS)
 
-    def analyze(self, target_region=None):
+    def load_frame(self):
+        """DBから分析用の表を読み込む（失敗したらNone）"""
         conn = sqlite3.connect(self.db_name)
         
-        # 結合クエリ（join_keyを使用）
-        query = """
-        SELECT 
-            T1.prefecture, 
-            T1.land_price, 
-            T2.tax_revenue,
-            T3.region
-        FROM land_prices AS T1
-        JOIN tax_revenue AS T2 ON T1.prefecture = T2.prefecture
-        LEFT JOIN regions AS T3 ON T1.prefecture = T3.join_key
-        """
+        # 結合済みの prefecture_metrics を読む（古いDBでなければ3表の結合は不要）
+        query = "SELECT prefecture, land_price, tax_revenue, region FROM prefecture_metrics"
 
         try:
             df = pd.read_sql(query, conn)
-        except Exception as e:
-            print(f"DB Error: {e}")
-            conn.close()
-            return
+        except Exception:
+            try:
+                df = pd.read_sql(DataManager.METRICS_QUERY, conn)
+            except Exception as e:
+                print(f"DB Error: {e}")
+                conn.close()
+                return None
 
         conn.close()
 
@@ -178,20 +609,37 @@ class Analyzer:
         if df['region'].isna().all() or df['region'].isna().sum() > 20:
             print("【補正】Webデータの結合が不十分なため、内蔵データで補完します。")
             df['region'] = df['prefecture'].map(self.region_map)
+        return df
 
-        # 動的フィルタリング
+    def filter_region(self, df, target_region):
+        """地域名で絞り込み、(絞り込んだ表, グラフのタイトル) を返す"""
         title_text = '【全国】都道府県の経済力(税収)と地価の相関'
         if target_region and target_region != "すべて":
             # ユーザー入力を部分一致で検索
-            filtered_df = df[df['region'].astype(str).str.contains(target_region, na=False)]
-            
-            if not filtered_df.empty:
-                df = filtered_df
-                title_text = f'【{target_region}】経済力(税収)と地価の相関'
-            else:
-                print(f"\n【注意】'{target_region}' のデータが見つかりませんでした。")
-                print("（入力例：関東、近畿、九州）")
-                print("※全国データを表示します。")
+            filtered_df = df[df['region'].astype(str).str.contains(target_region, na=False, regex=False)]
+            return self.use_filtered(df, filtered_df, target_region)
+        return df, title_text
+
+    def use_filtered(self, df, filtered_df, target_region):
+        """絞り込み結果が空なら全国データに戻す"""
+        if not filtered_df.empty:
+            return filtered_df, f'【{target_region}】経済力(税収)と地価の相関'
+
+        print(f"\n【注意】'{target_region}' のデータが見つかりませんでした。")
+        print("（入力例：関東、近畿、九州）")
+        print("※全国データを表示します。")
+        return df, '【全国】都道府県の経済力(税収)と地価の相関'
+
+    def analyze(self, target_region=None):
+        df = self.load_frame()
+        if df is None:
+            return
+        df, title_text = self.filter_region(df, target_region)
+        self.report(df, title_text)
+
+    def report(self, df, title_text, filename="result_graph.png"):
+        """分析結果を表示し、グラフを保存する"""
+        df = df.copy()
 
         # 分析結果
         print(f"\n--- 分析結果 ({title_text}) ---")
@@ -200,52 +648,231 @@ class Analyzer:
             print(f"相関係数: {df['land_price'].corr(df['tax_revenue']):.4f}")
 
         # グラフ描画
-        plt.figure(figsize=(10, 6))
-        
-        df['region'] = df['region'].fillna('その他')
-        regions = df['region'].unique()
-        
-        # 色分けプロット
-        for r in regions:
-            subset = df[df['region'] == r]
-            plt.scatter(subset['tax_revenue'], subset['land_price'], label=r, s=100, alpha=0.7, edgecolors='white')
-
-        # ラベル表示
-        for i, row in df.iterrows():
-            # データ数が少ない(絞り込み時)は全ラベル表示
-            if len(df) < 15 or row['tax_revenue'] > df['tax_revenue'].quantile(0.85) or row['land_price'] > df['land_price'].quantile(0.85):
-                plt.text(row['tax_revenue'], row['land_price'], row['prefecture'], fontsize=9, ha='left')
-
-        plt.title(title_text)
-        plt.xlabel('国税収納済額 (百万円)')
-        plt.ylabel('平均地価 (円/㎡)')
-        plt.legend(title="地方", bbox_to_anchor=(1.02, 1), loc='upper left')
-        plt.grid(True, linestyle='--', alpha=0.5)
-        plt.tight_layout()
+        fig, ax = plt.subplots(figsize=(10, 6))
+        draw_chart(ax, df, title_text)
+        fig.tight_layout()
         
-        # 保存
-        filename = "result_graph.png"
-        plt.savefig(filename)
+        # 保存（何度も描くのでメモリを解放しておく）
+        fig.savefig(filename)
+        plt.close(fig)
         print(f"\n★グラフを保存しました！: {filename}")
-        print("左側のファイル一覧から 'result_graph.png' をクリックして結果を確認してください。")
+        print(f"左側のファイル一覧から '{filename}' をクリックして結果を確認してください。")
+
+class AnalysisSession:
+    """分析用の表を1回だけ読み込み、地域ごとの問い合わせに何度も答える"""
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+        self.df = analyzer.load_frame()
+        if self.df is None:
+            raise RuntimeError("分析用のデータを読み込めませんでした。")
+        # 地方名 -> 行番号 の索引を先に作っておく（問い合わせのたびに全行を調べない）
+        self.region_index = self.df.groupby(self.df['region'].astype(str)).indices
+
+    def select(self, target_region):
+        """地域名(部分一致)で絞り込み、(表, タイトル) を返す"""
+        if not target_region or target_region == "すべて":
+            return self.analyzer.filter_region(self.df, None)
+
+        positions = [pos for name, pos in self.region_index.items() if target_region in name]
+        filtered_df = self.df.iloc[sorted(p for pos in positions for p in pos)]
+        return self.analyzer.use_filtered(self.df, filtered_df, target_region)
+
+    def query(self, target_region, filename="result_graph.png"):
+        df, title_text = self.select(target_region)
+        self.analyzer.report(df, title_text, filename)
+
+    def run_batch(self, regions):
+        """複数の地域をまとめて分析し、地域ごとに別のファイルへ保存する"""
+        for region in regions:
+            self.query(region, f"result_graph_{region}.png")
+
+    def repl(self):
+        """地域名を繰り返し入力して分析する（q か空行で終了）"""
+        print("\n分析したい地域を入力してください（例: 関東, 近畿, 九州, 東北 / すべて）")
+        print("q または何も入力せずにEnterで終了します。")
+        while True:
+            try:
+                user_input = input("地域名を入力 > ").strip()
+            except EOFError:
+                break
+            if user_input in ("", "q", "quit", "exit"):
+                break
+            self.query(user_input)
+
+# -----------------------------------------------------------
+# グラフ描画（pyplotの状態を使わず、渡された ax に描く）
+# -----------------------------------------------------------
+def draw_chart(ax, df, title_text):
+    """地方ごとに色分けした 税収×地価 の散布図を ax に描く"""
+    df = df.copy()
+    df['region'] = df['region'].fillna('その他')
+    regions = pd.Categorical(df['region'])
+    
+    # 色分けプロット（地方をカテゴリ番号にして1回で描く）
+    cmap = matplotlib.colormaps['tab10'].resampled(max(len(regions.categories), 1))
+    points = ax.scatter(df['tax_revenue'], df['land_price'], c=regions.codes, cmap=cmap,
+                        vmin=-0.5, vmax=len(regions.categories) - 0.5,
+                        s=100, alpha=0.7, edgecolors='white')
+    handles, _ = points.legend_elements(prop="colors", alpha=0.7)
+
+    # ラベル表示（しきい値は1回だけ計算する）
+    # データ数が少ない(絞り込み時)は全ラベル表示
+    if len(df) < 15:
+        labeled = df
+    else:
+        tax_limit = df['tax_revenue'].quantile(0.85)
+        land_limit = df['land_price'].quantile(0.85)
+        labeled = df[(df['tax_revenue'] > tax_limit) | (df['land_price'] > land_limit)]
+    for x, y, name in zip(labeled['tax_revenue'], labeled['land_price'], labeled['prefecture']):
+        ax.text(x, y, name, fontsize=9, ha='left')
+
+    ax.set_title(title_text)
+    ax.set_xlabel('国税収納済額 (百万円)')
+    ax.set_ylabel('平均地価 (円/㎡)')
+    ax.legend(handles, list(regions.categories), title="地方", bbox_to_anchor=(1.02, 1), loc='upper left')
+    ax.grid(True, linestyle='--', alpha=0.5)
+    return ax
+
+def use_agg_backend():
+    """（ワーカープロセスの初期化）画面を使わない Agg バックエンドにする"""
+    matplotlib.use("Agg")
+
+def render_chart_job(df, title_text, path):
+    """（別プロセスで実行）グラフ1枚を描いてファイルに保存する"""
+    fig = Figure(figsize=(10, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    draw_chart(ax, df, title_text)
+    fig.tight_layout()
+    fig.savefig(path)
+    # 何百枚も描くので、描き終えたらすぐに中身を捨てる
+    fig.clear()
+    return path
+
+class ChartRenderer:
+    """地方×年度のグラフを、別プロセスで並列にまとめて描く"""
+    FORMATS = ('png', 'svg')
+    YEAR_QUERY = """
+        SELECT L.fiscal_year, L.prefecture, L.land_price, T.tax_revenue
+        FROM land_prices_by_year AS L
+        JOIN tax_revenue_by_year AS T
+          ON L.fiscal_year = T.fiscal_year AND L.prefecture = T.prefecture
+    """
+
+    def __init__(self, db_name="final_analysis.db", out_dir="charts", fmt="png", workers=None):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"未対応の形式です: {fmt}")
+        self.db_name = db_name
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.workers = workers
+
+    def load_frames(self):
+        """{'latest' or 西暦年度: 表} を返す（年度別は --batch で取り込んだもの）"""
+        frames = {}
+        df = Analyzer(self.db_name).load_frame()
+        if df is not None:
+            # Webから取った地方名は「関東地方」のこともあるので、年度別(内蔵データ)の「関東」に揃える
+            df['region'] = df['region'].str.replace(r"地方$", "", regex=True)
+            frames['latest'] = df
+
+        conn = sqlite3.connect(self.db_name)
+        try:
+            years = pd.read_sql(self.YEAR_QUERY, conn)
+        except Exception:
+            years = None  # まだ --batch で取り込んでいない
+        conn.close()
+
+        if years is not None:
+            years['region'] = years['prefecture'].map(PREFECTURE_REGIONS)
+            for year, df_year in years.groupby('fiscal_year'):
+                frames[int(year)] = df_year.drop(columns='fiscal_year')
+        return frames
+
+    def make_jobs(self, frames, regions=None):
+        """(表, タイトル, 出力先) の一覧を作る。regions が None なら全国＋全地方"""
+        jobs = []
+        for label, df in frames.items():
+            period = "最新" if label == 'latest' else f"{label}年度"
+            if regions is None:
+                targets = ['全国'] + sorted(df['region'].dropna().unique())
+            else:
+                targets = regions
+            for region in targets:
+                # AnalysisSession と同じく地方名は部分一致で探す
+                if region == '全国':
+                    subset = df
+                else:
+                    subset = df[df['region'].astype(str).str.contains(region, na=False, regex=False)]
+                if subset.empty:
+                    print(f"  スキップ: {period} {region} のデータがありません。")
+                    continue
+                title_text = f'【{region}】{period} 経済力(税収)と地価の相関'
+                path = os.path.join(self.out_dir, f"result_graph_{label}_{region}.{self.fmt}")
+                jobs.append((subset, title_text, path))
+        return jobs
+
+    def run(self, regions=None):
+        frames = self.load_frames()
+        if not frames:
+            print("エラー: グラフにするデータがありません。")
+            return []
+        os.makedirs(self.out_dir, exist_ok=True)
+        jobs = self.make_jobs(frames, regions)
+
+        print(f"\n{len(jobs)} 枚のグラフを並列で描きます...")
+        started = time.perf_counter()
+        written = []
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=use_agg_backend) as pool:
+            futures = {pool.submit(render_chart_job, *job): job[2] for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    written.append(future.result())
+                except Exception as e:
+                    print(f"【エラー】{futures[future]}: {e}")
+        print(f"グラフ描画完了: {len(written)}/{len(jobs)} 枚 -> {self.out_dir}/ ({time.perf_counter() - started:.2f}秒)")
+        return written
 
 if __name__ == "__main__":
-    scraper = RegionScraper()
-    df_region = scraper.scrape()
+    parser = argparse.ArgumentParser(description="都道府県の税収と地価の分析")
+    parser.add_argument("--batch", metavar="DIR", help="rNN_xlsx_allfile2.xlsx / rNN_1001.xlsx が入ったフォルダを年度別にまとめて取り込む")
+    parser.add_argument("--workers", type=int, default=None, help="一括取り込みのプロセス数")
+    parser.add_argument("--regions", nargs="+", metavar="REGION", help="指定した地域をまとめて分析する (例: 関東 近畿)")
+    parser.add_argument("--repl", action="store_true", help="データを読み込んだまま、地域を何度でも分析する")
+    parser.add_argument("--charts", metavar="OUTDIR", help="地方×年度のグラフをまとめてフォルダに書き出す")
+    parser.add_argument("--format", choices=ChartRenderer.FORMATS, default="png", help="--charts の出力形式")
+    args = parser.parse_args()
+
+    if args.batch or args.charts:
+        if args.batch:
+            BatchIngestor(workers=args.workers).run(args.batch)
+        if args.charts:
+            ChartRenderer(out_dir=args.charts, fmt=args.format, workers=args.workers).run(args.regions)
+    else:
+        scraper = RegionScraper()
+        df_region = scraper.scrape()
     
-    file_land = "r05_xlsx_allfile2.xlsx"
-    file_tax = "r05_1001.xlsx"
+        file_land = "r05_xlsx_allfile2.xlsx"
+        file_tax = "r05_1001.xlsx"
     
-    if os.path.exists(file_land) and os.path.exists(file_tax):
-        manager = DataManager()
-        manager.process_excel_files(file_land, file_tax, df_region)
-        
-        print("\n分析したい地域を選んでください（例: 関東, 近畿, 九州, 東北）")
-        print("何も入力せずにEnterを押すと「全国」を分析します。")
-        user_input = input("地域名を入力 > ").strip()
-        target = user_input if user_input else "すべて"
-        
-        analyzer = Analyzer()
-        analyzer.analyze(target)
-    else:
-        print("エラー: ファイルが見つかりません。")
\ No newline at end of file
+        if os.path.exists(file_land) and os.path.exists(file_tax):
+            manager = DataManager()
+            manager.process_excel_files(file_land, file_tax, df_region)
+
+            if args.regions or args.repl:
+                # 表を1回だけ読み込み、複数の地域をまとめて分析する
+                session = AnalysisSession(Analyzer())
+                if args.regions:
+                    session.run_batch(args.regions)
+                else:
+                    session.repl()
+            else:
+                print("\n分析したい地域を選んでください（例: 関東, 近畿, 九州, 東北）")
+                print("何も入力せずにEnterを押すと「全国」を分析します。")
+                user_input = input("地域名を入力 > ").strip()
+                target = user_input if user_input else "すべて"
+            
+                analyzer = Analyzer()
+                analyzer.analyze(target)
+        else:
+            print("エラー: ファイルが見つかりません。")
\ No newline at end of file
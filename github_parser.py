@@ -0,0 +1,263 @@
+import argparse
+import glob
+import os
+import re
+import time
+
+from bs4 import BeautifulSoup
+import soupsieve as sv
+
+# --- 高速パーサ用（lxmlがなければ html.parser + 事前コンパイルしたCSSセレクタで代用） ---
+try:
+    from lxml import etree, html as lxml_html
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+# -----------------------------------------------------------
+# 定数定義
+# -----------------------------------------------------------
+# ベンチマーク用の保存済みHTML（改行あり・なし、言語名の書かれ方が違うページを含む）
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "github_fixtures")
+KNOWN_LANGUAGES = ["Python", "Java", "C++", "C", "Go", "JavaScript", "TypeScript", "HTML", "Dart", "Rust", "Shell", "Kotlin", "Swift", "Jupyter Notebook"]
+
+# 言語名をまとめて1回で探す正規表現（長い名前を先に試し、"Java" が "JavaScript" の一部に当たらないよう単語の区切りで判定する）
+LANGUAGE_PATTERN = re.compile(
+    r"(?<![\w+#])("
+    + "|".join(re.escape(lang) for lang in sorted(KNOWN_LANGUAGES, key=len, reverse=True))
+    + r")(?![\w+#])"
+)
+
+# リポジトリ一覧の入れ物。これより前（ヘッダーのナビなど）はどちらのパーサでも解析しない
+LIST_CONTAINER = re.compile(r"""<[^<>]*\bid=["']org-repositories["']""")
+
+if HAS_LXML:
+    # XPathは毎回解釈しないよう、ここで1回だけコンパイルしておく
+    REPO_ITEMS = etree.XPath("//li[.//h3//a]")
+    NAME_LINK = etree.XPath("(.//h3)[1]/descendant::a[1]")
+    LANGUAGE_TAG = etree.XPath(".//span[@itemprop='programmingLanguage']")
+    COLOR_DOT = etree.XPath(".//span[contains(@class, 'repo-language-color')]")
+    STAR_LINK = etree.XPath(".//a[substring(@href, string-length(@href) - 10) = '/stargazers']")
+
+# BeautifulSoup を使う場合: セレクタは事前にコンパイルしておく
+SV_NAME_LINK = sv.compile("h3 a")
+SV_LANGUAGE_TAG = sv.compile("span[itemprop='programmingLanguage']")
+SV_COLOR_DOT = sv.compile("span[class*='repo-language-color']")
+SV_STAR_LINK = sv.compile("a[href$='/stargazers']")
+
+# -----------------------------------------------------------
+# 共通の処理
+# -----------------------------------------------------------
+def parse_stars(raw_star):
+    """'1,234' や '12.3k' をスター数(int)にする"""
+    raw_star = raw_star.replace(",", "")
+    try:
+        if "k" in raw_star:
+            return int(float(raw_star.replace("k", "")) * 1000)
+        return int(raw_star)
+    except ValueError:
+        return 0
+
+def find_language(text):
+    """文字列に含まれる既知の言語名を返す（なければNone）"""
+    m = LANGUAGE_PATTERN.search(text)
+    return m.group(1) if m else None
+
+def language_from_dot(text):
+    """カラードットの親要素の文字列から言語名を決める"""
+    language = find_language(text)
+    if language is None and len(text) < 20:
+        language = text.replace("●", "").strip()
+    return language or None
+
+def list_html(page_html):
+    """リポジトリ一覧の入れ物から後ろだけを返す（見つからなければページ全体）"""
+    m = LIST_CONTAINER.search(page_html)
+    return page_html[m.start():] if m else page_html
+
+# -----------------------------------------------------------
+# 高速パーサ
+# -----------------------------------------------------------
+def _text(element):
+    """BeautifulSoup の get_text(strip=True) と同じ文字列を返す"""
+    return "".join(s.strip() for s in element.itertext())
+
+def _spaced_text(element):
+    """要素の文字列を空白で区切ってつなぐ（言語名の単語区切りの判定に使う）
+
+    改行のないHTMLでは隣の要素の文字とくっついて "libraryPython1.2k" のようになり、
+    正規表現の単語区切りに当たらなくなるため。
+    """
+    return " ".join(s.strip() for s in element.itertext() if s.strip())
+
+def _parse_lxml(page_html):
+    root = lxml_html.fromstring(list_html(page_html))
+    repos = []
+    for li in REPO_ITEMS(root):
+        links = NAME_LINK(li)
+        if not links:
+            continue
+        # Googleのリポジトリリンクか確認
+        href = links[0].get("href")
+        if not href or "google" not in href:
+            continue
+        repo_name = _text(links[0])
+
+        # 言語: itemprop → カラードット → li全体 の順に探す
+        language = None
+        lang_tags = LANGUAGE_TAG(li)
+        if lang_tags:
+            language = _text(lang_tags[0]) or None
+        if language is None:
+            dots = COLOR_DOT(li)
+            if dots and dots[0].getparent() is not None:
+                language = language_from_dot(_spaced_text(dots[0].getparent()))
+        if language is None:
+            language = find_language(_spaced_text(li))
+
+        star_links = STAR_LINK(li)
+        stars = parse_stars(_text(star_links[0])) if star_links else 0
+        repos.append((repo_name, language or "Unknown", stars))
+    return repos
+
+def _parse_soup(page_html):
+    soup = BeautifulSoup(list_html(page_html), "html.parser")
+    repos = []
+    for li in soup.find_all("li"):
+        link = SV_NAME_LINK.select_one(li)
+        if link is None:
+            continue
+        href = link.get("href")
+        if not href or "google" not in href:
+            continue
+        repo_name = link.get_text(strip=True)
+
+        language = None
+        lang_tag = SV_LANGUAGE_TAG.select_one(li)
+        if lang_tag is not None:
+            language = lang_tag.get_text(strip=True) or None
+        if language is None:
+            dot = SV_COLOR_DOT.select_one(li)
+            if dot is not None and dot.parent is not None:
+                language = language_from_dot(dot.parent.get_text(" ", strip=True))
+        if language is None:
+            language = find_language(li.get_text(" ", strip=True))
+
+        star_link = SV_STAR_LINK.select_one(li)
+        stars = parse_stars(star_link.get_text(strip=True)) if star_link is not None else 0
+        repos.append((repo_name, language or "Unknown", stars))
+    return repos
+
+def parse_repo_list(page_html):
+    """リポジトリ一覧ページから [(name, language, stars), ...] を返す"""
+    if HAS_LXML:
+        return _parse_lxml(page_html)
+    return _parse_soup(page_html)
+
+# -----------------------------------------------------------
+# 以前のパーサ（ノートブックの処理。比較用に残す）
+# -----------------------------------------------------------
+def parse_repo_list_legacy(page_html):
+    """ノートブックと同じ方法(html.parser + li ごとの find)で解析する"""
+    soup = BeautifulSoup(page_html, "html.parser")
+    repos = []
+    for li in soup.find_all("li"):
+        # リポジトリ名の取得
+        h3 = li.find("h3")
+        if not h3: continue
+        link = h3.find("a")
+        if not link: continue
+        # Googleのリポジトリリンクか確認
+        href = link.get("href")
+        if not href or "google" not in href: continue
+        repo_name = link.get_text(strip=True)
+
+        # --- プログラミング言語 ---
+        language = "Unknown"
+        # 1. itemprop属性
+        lang_tag = li.find("span", itemprop="programmingLanguage")
+        if lang_tag:
+            language = lang_tag.get_text(strip=True)
+        # 2. カラードットの親要素
+        if language == "Unknown":
+            color_dot = li.find("span", class_=lambda c: c and "repo-language-color" in c)
+            if color_dot and color_dot.parent:
+                text = color_dot.parent.get_text(strip=True)
+                for lang in KNOWN_LANGUAGES:
+                    if lang in text:
+                        language = lang
+                        break
+                if language == "Unknown" and len(text) < 20:
+                    language = text.replace("●", "").strip()
+        # 3. テキスト全体から探索
+        if language == "Unknown":
+            full_text = li.get_text()
+            for lang in KNOWN_LANGUAGES:
+                if lang in full_text:
+                    language = lang
+                    break
+
+        # --- スター数 ---
+        stars = 0
+        star_link = li.find("a", href=lambda h: h and h.endswith("/stargazers"))
+        if star_link:
+            stars = parse_stars(star_link.get_text(strip=True))
+
+        repos.append((repo_name, language, stars))
+    return repos
+
+# -----------------------------------------------------------
+# ベンチマーク（保存済みのHTMLで比べる）
+# -----------------------------------------------------------
+def benchmark(paths, repeat=20):
+    """保存済みHTMLを各パーサで解析し、1ページ・1リポジトリあたりの時間を表示する
+
+    負荷の揺れで差が逆転しないよう、1回ごとに全パーサを順に測り、一番速かった回を使う。
+    """
+    pages = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            pages.append(f.read())
+
+    parsers = [("legacy (html.parser + find)", parse_repo_list_legacy),
+               ("html.parser + soupsieve", _parse_soup)]
+    if HAS_LXML:
+        parsers.append(("lxml + XPath", _parse_lxml))
+
+    expected = [parse_repo_list_legacy(page) for page in pages]
+    total_repos = sum(len(r) for r in expected)
+    best = {label: float("inf") for label, _ in parsers}
+    for _ in range(repeat):
+        for label, parse in parsers:
+            started = time.perf_counter()
+            for page in pages:
+                parse(page)
+            best[label] = min(best[label], time.perf_counter() - started)
+
+    print(f"{len(pages)} pages / {total_repos} repos / best of {repeat}")
+    print(f"{'Parser':<30} | {'ms/page':>9} | {'us/repo':>9} | diff vs legacy")
+    print("-" * 71)
+    diffs = []
+    for label, parse in parsers:
+        results = [parse(page) for page in pages]
+        per_page = best[label] / len(pages) * 1000
+        per_repo = best[label] / total_repos * 1e6 if total_repos else 0.0
+        diff = [(old, new) for page_old, page_new in zip(expected, results)
+                for old, new in zip(page_old, page_new) if old != new]
+        diff_count = len(diff) + sum(abs(len(a) - len(b)) for a, b in zip(expected, results))
+        diffs.append((label, diff))
+        print(f"{label:<30} | {per_page:>9.3f} | {per_repo:>9.1f} | {diff_count}")
+
+    # 以前のパーサは部分一致で探すので "JavaScript" を "Java" と判定する。違いはその内容を表示する
+    for label, diff in diffs:
+        for old, new in diff:
+            print(f"  {label}: legacy {old} -> {new}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="保存済みのリポジトリ一覧HTMLでパーサの速さを比べる")
+    parser.add_argument("paths", nargs="*", help="保存したHTMLファイル（省略時は github_fixtures/*.html）")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html")))
+    benchmark(paths, args.repeat)
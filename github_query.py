@@ -0,0 +1,222 @@
+import argparse
+import sqlite3
+import time
+
+from github_store import DB_NAME, TOP_N, has_fts
+
+# 読み出しに必要なテーブルと索引（作るのは書き込み側の RepoStore）
+REQUIRED_OBJECTS = [
+    ("table", "repositories"),
+    ("table", "language_stats"),
+    ("table", "language_top"),
+    ("index", "idx_repositories_stars"),
+    ("index", "idx_repositories_language_stars"),
+    ("index", "idx_repositories_name_nocase"),
+]
+
+# 完全一致 → 前方一致 → 途中一致 の順に並べ、同じ順位の中ではスター数の多い順にする
+MATCH_ORDER = """
+    CASE
+        WHEN lower(r.name) = lower(:term) THEN 0
+        WHEN instr(lower(r.name), lower(:term)) = 1 THEN 1
+        ELSE 2
+    END
+"""
+
+SEARCH_FTS = f"""
+    SELECT r.name, r.language, r.stars
+    FROM repositories_fts AS f
+    JOIN repositories AS r ON r.id = f.rowid
+    WHERE repositories_fts MATCH :query
+    ORDER BY {MATCH_ORDER}, r.stars DESC, f.rank
+    LIMIT :limit
+"""
+
+SUBSTRING_SCAN_ROWS = 3000  # 短い語の途中一致を探す範囲（スター数の多い順にこの件数まで。約6ミリ秒）
+
+# trigram で引けない1〜2文字の語（または全文検索索引がないとき）は、まず前方一致を
+# idx_repositories_name_nocase の範囲検索で引く（:low 以上 :high 未満 = :low で始まる名前）
+SEARCH_PREFIX = f"""
+    SELECT r.name, r.language, r.stars
+    FROM repositories AS r
+    WHERE r.name >= :low COLLATE NOCASE AND r.name < :high COLLATE NOCASE
+    ORDER BY {MATCH_ORDER}, r.stars DESC
+    LIMIT :limit
+"""
+
+# 前方一致で足りない分だけ途中一致で補う。全件は走査せず、スター数の多い :scan 件の中から
+# idx_repositories_stars の順に探し、:limit 件見つかったところで止める
+SEARCH_SUBSTRING = """
+    SELECT name, language, stars
+    FROM repositories
+    WHERE stars >= IFNULL((SELECT stars FROM repositories ORDER BY stars DESC LIMIT 1 OFFSET :scan - 1), 0)
+      AND instr(lower(name), lower(:term)) > 1
+    ORDER BY stars DESC
+    LIMIT :limit
+"""
+
+# -----------------------------------------------------------
+# 読み出し用のAPI（索引と集計表だけを使い、全件走査しない）
+# -----------------------------------------------------------
+class RepoQuery:
+    """repositories への問い合わせをまとめたもの（ダッシュボードなどから使い回す）"""
+
+    def __init__(self, db_name=DB_NAME):
+        # 読み取り専用で開く（ダッシュボードから何度開いても書き込みロックを取らない）
+        try:
+            self.conn = sqlite3.connect(f"file:{db_name}?mode=ro", uri=True)
+        except sqlite3.OperationalError as e:
+            raise RuntimeError(f"{db_name} を開けません ({e})。先に github_scraper.py で取得してください。") from e
+        missing = [name for kind, name in REQUIRED_OBJECTS if not self.exists(kind, name)]
+        if missing:
+            self.conn.close()
+            raise RuntimeError(
+                f"{db_name} に {', '.join(missing)} がありません。"
+                "github_scraper.py (RepoStore) で一度書き込むと作られます。"
+            )
+        self.fts = has_fts(self.conn)
+
+    def exists(self, kind, name):
+        row = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?", (kind, name)
+        ).fetchone()
+        return row is not None
+
+    def top(self, limit=30):
+        """スター数の多い順に [(name, language, stars), ...]（idx_repositories_stars を使う）"""
+        return self.conn.execute(
+            "SELECT name, language, stars FROM repositories ORDER BY stars DESC LIMIT ?", (limit,)
+        ).fetchall()
+
+    def leaderboard(self, language, limit=TOP_N):
+        """言語ごとの上位 [(name, stars), ...]。TOP_N 件までは集計表から返す"""
+        if limit <= TOP_N:
+            return self.conn.execute(
+                "SELECT name, stars FROM language_top WHERE language = ? ORDER BY rank LIMIT ?",
+                (language, limit),
+            ).fetchall()
+        return self.conn.execute(
+            "SELECT name, stars FROM repositories WHERE language = ? ORDER BY stars DESC LIMIT ?",
+            (language, limit),
+        ).fetchall()
+
+    def languages(self):
+        """言語ごとの [(language, repo_count, total_stars), ...]（件数の多い順）"""
+        return self.conn.execute(
+            "SELECT language, repo_count, total_stars FROM language_stats ORDER BY repo_count DESC, language"
+        ).fetchall()
+
+    def star_range(self, min_stars, max_stars, language=None, limit=100):
+        """スター数が min_stars 以上 max_stars 以下のリポジトリを多い順に返す"""
+        if language is None:
+            return self.conn.execute(
+                "SELECT name, language, stars FROM repositories WHERE stars BETWEEN ? AND ? "
+                "ORDER BY stars DESC LIMIT ?",
+                (min_stars, max_stars, limit),
+            ).fetchall()
+        return self.conn.execute(
+            "SELECT name, language, stars FROM repositories WHERE language = ? AND stars BETWEEN ? AND ? "
+            "ORDER BY stars DESC LIMIT ?",
+            (language, min_stars, max_stars, limit),
+        ).fetchall()
+
+    def search(self, term, limit=20):
+        """名前の一部で探し、[(name, language, stars), ...] を一致の良い順・スター数の多い順に返す
+
+        大文字小文字は区別しない（SQLiteの NOCASE / lower と同じく、ASCIIの英字だけ）。
+        3文字以上は全文検索索引で途中一致を探す。trigram で引けない1〜2文字の語は、
+        前方一致を索引で引き、足りない分だけスター数の多い SUBSTRING_SCAN_ROWS 件の中から
+        途中一致で補う（全文検索索引がないSQLiteでは長い語も同じ）。そのため、短い語の途中一致は
+        スター数の少ないリポジトリまでは探さない。
+        """
+        term = term.strip()
+        if not term:
+            return []
+        params = {"term": term, "limit": limit}
+        if not self.fts or len(term) < 3:
+            # U+10FFFF はどの文字よりも後ろに並ぶので、term で始まる名前はすべて [low, high) に入る
+            rows = self.conn.execute(
+                SEARCH_PREFIX, dict(params, low=term, high=term + "\U0010ffff")
+            ).fetchall()
+            if len(rows) < limit:
+                rows += self.conn.execute(
+                    SEARCH_SUBSTRING, dict(params, limit=limit - len(rows), scan=SUBSTRING_SCAN_ROWS)
+                ).fetchall()
+            return rows
+        # 語全体を1つのフレーズとして渡す（"-" や "*" などを演算子として解釈させない）
+        query = '"' + term.replace('"', '""') + '"'
+        return self.conn.execute(SEARCH_FTS, dict(params, query=query)).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+# -----------------------------------------------------------
+# 表示
+# -----------------------------------------------------------
+def print_repos(rows, title):
+    """(name, language, stars) の一覧を表示する"""
+    print(f"\n--- {title} ---")
+    print(f"{'Rank':<5} | {'Repository Name':<35} | {'Language':<15} | {'Stars':<10}")
+    print("-" * 75)
+    for i, row in enumerate(rows, 1):
+        print(f"{i:<5} | {row[0]:<35} | {row[1]:<15} | {row[2]:<10}")
+
+def print_top(db_name=DB_NAME, limit=30):
+    """スター数の多いリポジトリを表示する"""
+    query = RepoQuery(db_name)
+    print_repos(query.top(limit), f"Top {limit} Starred Repositories")
+    query.close()
+
+# -----------------------------------------------------------
+# コマンドライン
+# -----------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="google_repos_all.db を検索する")
+    parser.add_argument("--db", default=DB_NAME)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_top = sub.add_parser("top", help="スター数の多い順")
+    p_top.add_argument("-n", type=int, default=30)
+
+    p_lang = sub.add_parser("lang", help="言語ごとのランキング")
+    p_lang.add_argument("language")
+    p_lang.add_argument("-n", type=int, default=TOP_N)
+
+    sub.add_parser("languages", help="言語ごとの件数とスター合計")
+
+    p_range = sub.add_parser("range", help="スター数の範囲で探す")
+    p_range.add_argument("min_stars", type=int)
+    p_range.add_argument("max_stars", type=int)
+    p_range.add_argument("--language")
+    p_range.add_argument("-n", type=int, default=100)
+
+    p_search = sub.add_parser("search", help="名前の一部で探す（スター数の多い順）")
+    p_search.add_argument("term")
+    p_search.add_argument("-n", type=int, default=20)
+
+    args = parser.parse_args()
+    try:
+        query = RepoQuery(args.db)
+    except RuntimeError as e:
+        parser.exit(1, f"Error: {e}\n")
+
+    if args.command == "top":
+        print_repos(query.top(args.n), f"Top {args.n} Starred Repositories")
+    elif args.command == "lang":
+        rows = query.leaderboard(args.language, args.n)
+        print_repos([(name, args.language, stars) for name, stars in rows], f"Top {args.n} {args.language} Repositories")
+    elif args.command == "languages":
+        print(f"{'Language':<20} | {'Repos':>6} | {'Total Stars':>12}")
+        print("-" * 45)
+        for language, count, total in query.languages():
+            print(f"{language:<20} | {count:>6} | {total:>12}")
+    elif args.command == "range":
+        rows = query.star_range(args.min_stars, args.max_stars, args.language, args.n)
+        print_repos(rows, f"Stars {args.min_stars} - {args.max_stars}")
+    elif args.command == "search":
+        started = time.perf_counter()
+        rows = query.search(args.term, args.n)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print_repos(rows, f"Search '{args.term}' ({len(rows)} hits, {elapsed_ms:.2f} ms)")
+
+    query.close()
@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from github_parser import parse_repo_list
+from github_query import print_top
+from github_store import DB_NAME, RepoStore
+
+# -----------------------------------------------------------
+# 定数定義
+# -----------------------------------------------------------
+BASE_URL = "https://github.com/orgs/google/repositories"
+CHECKPOINT_FILE = "google_repos_checkpoint.json"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+MAX_PAGES = 100
+DEFAULT_WORKERS = 4      # 同時に取得するページ数
+DEFAULT_RATE = 2.0       # 最大リクエスト数/秒（429が返ってきたら自動で下げる）
+MAX_RETRIES = 5          # 429/503 のときに同じページを取り直す回数
+
+# -----------------------------------------------------------
+# 429/Retry-After に合わせて間隔を変えるレート制限
+# -----------------------------------------------------------
+def parse_retry_after(value, default=10.0):
+    """Retry-After (秒数 または HTTP日付) を待ち秒数にする"""
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+class AdaptiveRateLimiter:
+    """全スレッド共通でリクエストの間隔をあける
+
+    429 が返ってきたら Retry-After の間は全スレッドを止め、間隔を2倍に広げる。
+    成功が続けば少しずつ元の間隔まで戻す。
+    """
+
+    def __init__(self, rate_per_sec, max_interval=30.0):
+        self.min_interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self.interval = self.min_interval
+        self.max_interval = max_interval
+        self.next_time = 0.0  # 次に送ってよい時刻
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            send_at = max(now, self.next_time)
+            self.next_time = send_at + self.interval
+        if send_at > now:
+            time.sleep(send_at - now)
+
+    def success(self):
+        with self.lock:
+            self.interval = max(self.min_interval, self.interval * 0.9)
+
+    def backoff(self, retry_after):
+        with self.lock:
+            self.interval = min(self.max_interval, max(self.interval * 2, 0.5))
+            self.next_time = max(self.next_time, time.monotonic() + retry_after)
+
+# -----------------------------------------------------------
+# 途中から再開するためのチェックポイント
+# -----------------------------------------------------------
+class Checkpoint:
+    """最後に保存まで終わったページ番号をJSONファイルに記録する
+
+    途中で止まった取得を再開するためだけに使う。最後まで取得できたら消すので、
+    次の実行はまた1ページ目から取り直す（変わった行だけがDBに書き込まれる）。
+    """
+
+    def __init__(self, path, base_url):
+        self.path = path
+        self.base_url = base_url
+        self.last_page = 0
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        # 別のURLを取っていたときの記録や、最後まで終わっていた記録は使わない
+        if data.get("base_url") == base_url and not data.get("finished", False):
+            self.last_page = data.get("last_page", 0)
+
+    def save(self, last_page):
+        self.last_page = last_page
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"base_url": self.base_url, "last_page": last_page,
+                       "updated_at": time.time()}, f)
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        self.last_page = 0
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+# -----------------------------------------------------------
+# クローラ本体
+# -----------------------------------------------------------
+def page_url(base_url, page_num):
+    """ページのURLを作る。base_url に {page} があればそこに埋め込む（ローカルの保存済みHTML用）"""
+    if "{page}" in base_url:
+        return base_url.format(page=page_num)
+    return f"{base_url}?page={page_num}"
+
+def make_session(workers):
+    """Keep-Aliveの接続を全スレッドで共有するSessionを作る"""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def fetch_page(session, limiter, url, retries=MAX_RETRIES):
+    """1ページ分のHTMLを返す。429/503 なら Retry-After だけ待って取り直す"""
+    for _ in range(retries + 1):
+        limiter.wait()
+        response = session.get(url, timeout=10)
+        if response.status_code in (429, 503):
+            delay = parse_retry_after(response.headers.get("Retry-After"))
+            print(f"\n  Rate limited ({response.status_code}): wait {delay:.1f}s ... {url}")
+            limiter.backoff(delay)
+            continue
+        if response.status_code != 200:
+            raise RuntimeError(f"Status {response.status_code}")
+        limiter.success()
+        return response.text
+    raise RuntimeError(f"Too many retries: {url}")
+
+def crawl(base_url=BASE_URL, db_name=DB_NAME, max_pages=MAX_PAGES, workers=DEFAULT_WORKERS,
+          rate=DEFAULT_RATE, checkpoint_path=CHECKPOINT_FILE, resume=True):
+    """一覧ページを並列に取得し、ページ順にDBへ保存する。保存したリポジトリ数を返す"""
+    checkpoint = Checkpoint(checkpoint_path, base_url)
+    if not resume:
+        checkpoint.reset()
+
+    start_page = checkpoint.last_page + 1
+    store = RepoStore(db_name)
+    session = make_session(workers)
+    limiter = AdaptiveRateLimiter(rate)
+
+    def fetch_and_parse(page_num):
+        return parse_repo_list(fetch_page(session, limiter, page_url(base_url, page_num)))
+
+    print(f"Scraping Start: {base_url}")
+    if start_page > 1:
+        print(f"Resume from page {start_page} (checkpoint: {checkpoint_path})")
+    print(f"Target Pages: {max_pages} ({workers} workers, {rate}/sec)")
+    started = time.perf_counter()
+    total_saved = 0
+    next_page = start_page
+    pending = deque()  # (page_num, future) をページ順に並べる
+    stop = False
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # 同時に取得するのは workers ページまで
+            while not stop and len(pending) < workers and next_page <= max_pages:
+                pending.append((next_page, pool.submit(fetch_and_parse, next_page)))
+                next_page += 1
+            if not pending:
+                break
+
+            # 保存はページ順に行い、チェックポイントは「ここまで全部保存した」ページを指す
+            page_num, future = pending.popleft()
+            if stop:
+                future.cancel()
+                continue
+            print(f"Processing Page {page_num:<3} ... ", end="", flush=True)
+            try:
+                repos = future.result()
+            except Exception as e:
+                print(f"\nError: {e}")
+                stop = True
+                continue
+
+            if not repos:
+                print("No repos found. (End of list).")
+                checkpoint.reset()  # 最後まで取得できたので、次回は最初から取り直す
+                stop = True
+                continue
+
+            # 1ページ分を1トランザクションで保存してからチェックポイントを進める
+            changed_before = store.changed
+            store.add(repos)
+            store.flush()
+            changed = store.changed - changed_before
+            if page_num == max_pages:
+                checkpoint.reset()
+            else:
+                checkpoint.save(page_num)
+            total_saved += len(repos)
+            print(f"Done. ({len(repos)} repos, {changed} changed)")
+
+    store.close()
+    print("-" * 50)
+    print(f"Scraping Completed. Total Repositories Saved: {total_saved} ({time.perf_counter() - started:.2f} sec)")
+    print(f"Changed rows: {store.changed} (unchanged rows were not rewritten)")
+    return total_saved
+
+# -----------------------------------------------------------
+# コマンドライン
+# -----------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GitHub organization のリポジトリ一覧を取得してDBに保存する")
+    parser.add_argument("--base-url", default=BASE_URL,
+                        help="一覧ページのURL（{page} を含めるとページ番号をそこに埋め込む）")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--max-pages", type=int, default=MAX_PAGES)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="最大リクエスト数/秒")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+    parser.add_argument("--restart", action="store_true", help="中断したときのチェックポイントを捨てて最初から取得する")
+    args = parser.parse_args()
+
+    crawl(args.base_url, args.db, args.max_pages, args.workers, args.rate,
+          args.checkpoint, resume=not args.restart)
+    print_top(args.db)
@@ -0,0 +1,303 @@
+import sqlite3
+import time
+
+# -----------------------------------------------------------
+# 定数定義
+# -----------------------------------------------------------
+DB_NAME = "google_repos_all.db"
+DEFAULT_BATCH_SIZE = 30  # 一覧1ページ分
+
+CREATE_REPOSITORIES = """
+    CREATE TABLE IF NOT EXISTS repositories (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        language TEXT,
+        stars INTEGER,
+        scraped_at REAL
+    )
+"""
+
+# 同じ名前があればスター数・言語だけを書き換える。値が同じ行は書き込まない（scraped_at もそのまま）
+UPSERT_REPOSITORY = """
+    INSERT INTO repositories (name, language, stars, scraped_at) VALUES (?, ?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET
+        language = excluded.language,
+        stars = excluded.stars,
+        scraped_at = excluded.scraped_at
+    WHERE repositories.language IS NOT excluded.language
+       OR repositories.stars IS NOT excluded.stars
+"""
+
+TOP_N = 10  # 言語ごとに覚えておく上位件数
+# 言語が分からないリポジトリの language（集計表・トリガーは NULL を扱わないので必ずこの値にする）
+UNKNOWN_LANGUAGE = "Unknown"
+
+# 検索用の索引（スター順・言語ごとのスター順を全件走査せずに引く）
+CREATE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_repositories_stars ON repositories (stars DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_repositories_language_stars ON repositories (language, stars DESC)",
+    # 1〜2文字の語の検索用（大文字小文字を区別しない前方一致を範囲検索で引く）
+    "CREATE INDEX IF NOT EXISTS idx_repositories_name_nocase ON repositories (name COLLATE NOCASE)",
+]
+
+# 言語ごとの集計（件数・スター合計）と上位 TOP_N 件
+CREATE_AGGREGATES = [
+    """
+    CREATE TABLE IF NOT EXISTS language_stats (
+        language TEXT PRIMARY KEY,
+        repo_count INTEGER NOT NULL,
+        total_stars INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS language_top (
+        language TEXT NOT NULL,
+        rank INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        stars INTEGER,
+        PRIMARY KEY (language, rank)
+    ) WITHOUT ROWID
+    """,
+    # language_top を作り直す必要がある言語
+    "CREATE TABLE IF NOT EXISTS dirty_languages (language TEXT PRIMARY KEY) WITHOUT ROWID",
+]
+
+# repositories が変わるたびに language_stats を差分で更新するトリガー
+# （外側のUPSERTの衝突処理が優先されるので、トリガー内では INSERT OR IGNORE を使わない）
+CREATE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS repositories_after_insert AFTER INSERT ON repositories
+    BEGIN
+        INSERT INTO language_stats (language, repo_count, total_stars)
+        SELECT new.language, 0, 0 WHERE NOT EXISTS (SELECT 1 FROM language_stats WHERE language = new.language);
+        UPDATE language_stats SET repo_count = repo_count + 1, total_stars = total_stars + IFNULL(new.stars, 0)
+        WHERE language = new.language;
+        INSERT INTO dirty_languages (language)
+        SELECT new.language WHERE NOT EXISTS (SELECT 1 FROM dirty_languages WHERE language = new.language);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS repositories_after_update AFTER UPDATE OF language, stars ON repositories
+    BEGIN
+        UPDATE language_stats SET repo_count = repo_count - 1, total_stars = total_stars - IFNULL(old.stars, 0)
+        WHERE language = old.language;
+        INSERT INTO language_stats (language, repo_count, total_stars)
+        SELECT new.language, 0, 0 WHERE NOT EXISTS (SELECT 1 FROM language_stats WHERE language = new.language);
+        UPDATE language_stats SET repo_count = repo_count + 1, total_stars = total_stars + IFNULL(new.stars, 0)
+        WHERE language = new.language;
+        DELETE FROM language_stats WHERE language = old.language AND repo_count <= 0;
+        INSERT INTO dirty_languages (language)
+        SELECT old.language WHERE NOT EXISTS (SELECT 1 FROM dirty_languages WHERE language = old.language);
+        INSERT INTO dirty_languages (language)
+        SELECT new.language WHERE NOT EXISTS (SELECT 1 FROM dirty_languages WHERE language = new.language);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS repositories_after_delete AFTER DELETE ON repositories
+    BEGIN
+        UPDATE language_stats SET repo_count = repo_count - 1, total_stars = total_stars - IFNULL(old.stars, 0)
+        WHERE language = old.language;
+        DELETE FROM language_stats WHERE language = old.language AND repo_count <= 0;
+        INSERT INTO dirty_languages (language)
+        SELECT old.language WHERE NOT EXISTS (SELECT 1 FROM dirty_languages WHERE language = old.language);
+    END
+    """,
+]
+
+REFRESH_LANGUAGE_TOP = """
+    INSERT INTO language_top (language, rank, name, stars)
+    SELECT ?, ROW_NUMBER() OVER (ORDER BY stars DESC, name), name, stars
+    FROM (
+        SELECT name, stars FROM repositories
+        WHERE language = ?
+        ORDER BY stars DESC, name
+        LIMIT ?
+    )
+"""
+
+# リポジトリ名の部分一致検索用の全文検索索引（trigram: 3文字ずつに区切るので途中の文字列でも引ける）
+CREATE_FTS = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS repositories_fts USING fts5(
+        name, content='repositories', content_rowid='id', tokenize='trigram'
+    )
+"""
+
+# repositories と全文検索索引を同期させるトリガー
+CREATE_FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS repositories_fts_insert AFTER INSERT ON repositories
+    BEGIN
+        INSERT INTO repositories_fts (rowid, name) VALUES (new.id, new.name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS repositories_fts_delete AFTER DELETE ON repositories
+    BEGIN
+        INSERT INTO repositories_fts (repositories_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS repositories_fts_update AFTER UPDATE OF name ON repositories
+    BEGIN
+        INSERT INTO repositories_fts (repositories_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO repositories_fts (rowid, name) VALUES (new.id, new.name);
+    END
+    """,
+]
+
+# -----------------------------------------------------------
+# テーブルの用意（以前の形式のDBも移行する）
+# -----------------------------------------------------------
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+def has_unique_name(conn):
+    """repositories.name にUNIQUE制約(索引)があるか"""
+    for index in conn.execute("PRAGMA index_list(repositories)"):
+        if index[2]:  # unique
+            columns = [row[2] for row in conn.execute(f"PRAGMA index_info({index[1]})")]
+            if columns == ["name"]:
+                return True
+    return False
+
+def init_db(conn):
+    """repositories テーブルを用意する
+
+    以前のノートブックで作ったDB（name にUNIQUEがなく scraped_at もない）は、
+    同じ名前の行を1つにまとめてから新しい形式に作り直す。
+    """
+    columns = table_columns(conn, "repositories")
+    if columns and ("scraped_at" not in columns or not has_unique_name(conn)):
+        print("Migrating repositories table (unique name + scraped_at) ...")
+        conn.execute("BEGIN")
+        try:
+            conn.execute("ALTER TABLE repositories RENAME TO repositories_old")
+            conn.execute(CREATE_REPOSITORIES)
+            scraped_at = "scraped_at" if "scraped_at" in columns else "NULL"
+            # 同じ名前が複数あれば、後から保存した方(idが大きい方)を残す
+            conn.execute(f"""
+                INSERT INTO repositories (id, name, language, stars, scraped_at)
+                SELECT id, name, language, stars, {scraped_at} FROM repositories_old
+                WHERE id IN (SELECT MAX(id) FROM repositories_old GROUP BY name)
+            """)
+            conn.execute("DROP TABLE repositories_old")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    else:
+        conn.execute(CREATE_REPOSITORIES)
+        conn.commit()
+    init_aggregates(conn)
+    init_fts(conn)
+
+def init_aggregates(conn):
+    """索引・言語ごとの集計表・トリガーを用意する（初回は今ある行から集計する）"""
+    is_new = not table_columns(conn, "language_stats")
+    conn.execute("BEGIN")
+    try:
+        if is_new:
+            # 以前に NULL で保存された行は、集計する前に UNKNOWN_LANGUAGE にそろえる（トリガーを作る前に行う）
+            conn.execute("UPDATE repositories SET language = ? WHERE language IS NULL", (UNKNOWN_LANGUAGE,))
+        for sql in CREATE_INDEXES + CREATE_AGGREGATES + CREATE_TRIGGERS:
+            conn.execute(sql)
+        if is_new:
+            conn.execute("""
+                INSERT INTO language_stats (language, repo_count, total_stars)
+                SELECT language, COUNT(*), IFNULL(SUM(stars), 0) FROM repositories GROUP BY language
+            """)
+            conn.execute("INSERT OR IGNORE INTO dirty_languages (language) SELECT language FROM language_stats")
+            refresh_language_top(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def has_fts(conn):
+    return bool(table_columns(conn, "repositories_fts"))
+
+def init_fts(conn):
+    """全文検索索引と同期用トリガーを用意する（初回は今ある行から作る）
+
+    FTS5(trigram) が使えないSQLiteでは何もせず False を返す（検索は LIKE で行う）。
+    """
+    is_new = not has_fts(conn)
+    conn.execute("BEGIN")
+    try:
+        conn.execute(CREATE_FTS)
+        for sql in CREATE_FTS_TRIGGERS:
+            conn.execute(sql)
+        if is_new:
+            conn.execute("INSERT INTO repositories_fts (repositories_fts) VALUES ('rebuild')")
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        conn.rollback()
+        print(f"Warning: full-text index is not available ({e}). Search falls back to LIKE.")
+        return False
+    return True
+
+def refresh_language_top(conn, top_n=TOP_N):
+    """変更のあった言語だけ、上位 top_n 件を索引から引き直す（トランザクション内で呼ぶ）"""
+    languages = [row[0] for row in conn.execute("SELECT language FROM dirty_languages")]
+    for language in languages:
+        conn.execute("DELETE FROM language_top WHERE language = ?", (language,))
+        conn.execute(REFRESH_LANGUAGE_TOP, (language, language, top_n))
+    conn.execute("DELETE FROM dirty_languages")
+    return len(languages)
+
+# -----------------------------------------------------------
+# まとめて書き込む保存先
+# -----------------------------------------------------------
+class RepoStore:
+    """取得したリポジトリを溜めておき、batch_size 件ごとに1トランザクションで保存する"""
+
+    def __init__(self, db_name=DB_NAME, batch_size=DEFAULT_BATCH_SIZE):
+        # トランザクションは自分で BEGIN/COMMIT する
+        self.conn = sqlite3.connect(db_name, isolation_level=None)
+        self.batch_size = batch_size
+        self.buffer = []
+        self.written = 0   # 受け取った行数
+        self.changed = 0   # そのうち追加・更新された行数
+        init_db(self.conn)
+
+    def add(self, repos, scraped_at=None):
+        """[(name, language, stars), ...] を溜める。batch_size に達したら保存する
+
+        language が None や空文字なら UNKNOWN_LANGUAGE として保存する。
+        """
+        if scraped_at is None:
+            scraped_at = time.time()
+        self.buffer.extend((name, language or UNKNOWN_LANGUAGE, stars, scraped_at)
+                           for name, language, stars in repos)
+        if len(self.buffer) >= self.batch_size:
+            return self.flush()
+        return 0
+
+    def flush(self):
+        """溜めた行を保存し、追加・更新された行数を返す"""
+        if not self.buffer:
+            return 0
+        self.conn.execute("BEGIN")
+        try:
+            # rowcount はトリガーによる変更を含まない（=追加・更新された repositories の行数）
+            changed = self.conn.executemany(UPSERT_REPOSITORY, self.buffer).rowcount
+            # 集計(language_stats)はトリガーで更新済み。上位一覧は変わった言語だけ作り直す
+            refresh_language_top(self.conn)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.written += len(self.buffer)
+        self.changed += changed
+        self.buffer = []
+        return changed
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,3 +1,5 @@
+import asyncio
+
 import flet as ft
 import requests
 
@@ -87,31 +89,51 @@ def main(page: ft.Page):
     # 3. ロジック（動き）の定義
     # -------------------------------------------------------
 
+    # 実行中の読み込みタスク（別の地域がクリックされたらキャンセルする）
+    current_load = {"future": None, "seq": 0}
+
+    # 予報JSONをダウンロードする（ワーカースレッドで実行）
+    def fetch_forecast_json(target_code):
+        # 【修正箇所2】URLの決定ロジック
+        # 例外マップにあれば親コードを、なければそのままのコードを使用
+        file_code = URL_EXCEPTIONS.get(target_code, target_code)
+        url = f"{FORECAST_URL_BASE}{file_code}.json"
+        
+        print(f"Fetching: {url} (Target: {target_code})") # ログ出力
+
+        response = requests.get(url, timeout=10)
+        
+        if response.status_code != 200:
+            raise Exception(f"データ取得失敗: {response.status_code}")
+
+        return response.json()
+
     # 【機能A】選択された地域の天気を取得して表示する
     def display_weather(e):
         # ボタンから地域コードと名前を取り出す
         target_code = e.control.data # 本来のコード (例: 014030)
         region_name = e.control.title.value
+
+        # 前の地域の読み込みが終わっていなければキャンセル
+        if current_load["future"] is not None and not current_load["future"].done():
+            current_load["future"].cancel()
+        current_load["seq"] += 1
         
         # 画面をリセットして読み込み中にする
         weather_grid.controls.clear()
         message_area.content = ft.Text(f"{region_name}のデータを取得中...", color=ft.Colors.BLACK)
         page.update()
 
-        try:
-            # 【修正箇所2】URLの決定ロジック
-            # 例外マップにあれば親コードを、なければそのままのコードを使用
-            file_code = URL_EXCEPTIONS.get(target_code, target_code)
-            url = f"{FORECAST_URL_BASE}{file_code}.json"
-            
-            print(f"Fetching: {url} (Target: {target_code})") # ログ出力
+        # 通信は裏で行い、ハンドラはすぐ返してUIを固めない
+        current_load["future"] = page.run_task(load_weather, target_code, current_load["seq"])
 
-            response = requests.get(url)
-            
-            if response.status_code != 200:
-                raise Exception(f"データ取得失敗: {response.status_code}")
+    async def load_weather(target_code, seq):
+        try:
+            data = await asyncio.to_thread(fetch_forecast_json, target_code)
 
-            data = response.json()
+            # 待っている間に別の地域がクリックされていたら、古い結果は捨てる
+            if seq != current_load["seq"]:
+                return
 
             # --- JSON解析 ---
             time_series = data[0]["timeSeries"][0]
@@ -180,17 +202,23 @@ def main(page: ft.Page):
                 )
                 weather_grid.controls.append(card)
 
+        except asyncio.CancelledError:
+            print(f"Cancelled: {target_code}")
+            return
         except Exception as err:
             import traceback
             traceback.print_exc()
+            if seq != current_load["seq"]:
+                return # 古いリクエストのエラーは表示しない
             message_area.content = ft.Text(f"エラーが発生しました: {err}", color=ft.Colors.RED)
         
         page.update()
 
     # 【機能B】起動時に地域リストを読み込んでサイドバーを作る
-    def load_area_list():
+    async def load_area_list():
         try:
-            response = requests.get(AREA_URL)
+            # area.json の取得はスレッドに任せる
+            response = await asyncio.to_thread(requests.get, AREA_URL, timeout=10)
             data = response.json()
             
             sidebar_items = [
@@ -240,6 +268,7 @@ def main(page: ft.Page):
         )
     )
 
-    load_area_list()
+    # 地域リストは裏で取得し、届いたらサイドバーを作る
+    page.run_task(load_area_list)
 
 ft.app(target=main)
\ No newline at end of file
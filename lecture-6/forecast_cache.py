@@ -0,0 +1,171 @@
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from weather_db import (
+    get_cache_entry, save_cache_entry, touch_cache_entry,
+    get_meta, set_meta, save_area_tree,
+)
+
+# -----------------------------------------------------------
+# 定数定義
+# -----------------------------------------------------------
+AREA_URL = "http://www.jma.go.jp/bosai/common/const/area.json"
+FORECAST_URL_BASE = "https://www.jma.go.jp/bosai/forecast/data/forecast/"
+
+# 例外的なURL対応
+URL_EXCEPTIONS = {
+    "014030": "014100",  # 十勝 -> 釧路
+    "460040": "460100",  # 奄美 -> 鹿児島
+}
+
+# 気象庁の天気予報は 5時・11時・17時(日本時間) に発表される
+JST = timezone(timedelta(hours=9))
+PUBLISH_HOURS = (5, 11, 17)
+# 発表直後はまだ新しいファイルが置かれていないことがあるので少し余裕を持たせる
+PUBLISH_MARGIN = timedelta(minutes=10)
+
+# -----------------------------------------------------------
+# 鮮度の判定
+# -----------------------------------------------------------
+def next_publish_time(fetched_at):
+    """取得時刻(UNIX時刻)の次の発表時刻(UNIX時刻)を返す"""
+    fetched = datetime.fromtimestamp(fetched_at, JST)
+    day = fetched.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    for days in (0, 1):
+        for hour in PUBLISH_HOURS:
+            publish = day + timedelta(days=days, hours=hour) + PUBLISH_MARGIN
+            if publish > fetched:
+                return publish.timestamp()
+
+def is_fresh(fetched_at, now=None):
+    """次の発表時刻をまだ過ぎていなければ新しいとみなす"""
+    if fetched_at is None:
+        return False
+    if now is None:
+        now = time.time()
+    return now < next_publish_time(fetched_at)
+
+# -----------------------------------------------------------
+# キャッシュ本体
+# -----------------------------------------------------------
+class ForecastCache:
+    """予報JSONをファイルコード単位でSQLiteにキャッシュする"""
+
+    def __init__(self, base_url=FORECAST_URL_BASE):
+        self.base_url = base_url
+        self.session = requests.Session()  # Keep-Aliveで接続を使い回す
+        self.hits = 0          # 通信せずにDBから返した回数
+        self.misses = 0        # ネットワークに問い合わせた回数
+        self.not_modified = 0  # そのうち 304 が返ってきた回数
+
+    def get(self, file_code):
+        """予報JSONを返す。戻り値は (data, from_cache)
+
+        from_cache が True のときは発表間隔内のキャッシュで、通信していない。
+        取得できなかった場合は (None, False) を返す。
+        """
+        entry = get_cache_entry(file_code)
+
+        # 1. 発表間隔内ならネットワークに行かない
+        if entry is not None and is_fresh(entry["fetched_at"]):
+            self.hits += 1
+            return json.loads(entry["body"]), True
+
+        # 2. 期限切れ(または未取得)なら条件付きGET
+        self.misses += 1
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        url = f"{self.base_url}{file_code}.json"
+        print(f"API Fetching: {url}") # Log
+        response = self.session.get(url, headers=headers, timeout=10)
+        now = time.time()
+
+        if response.status_code == 304 and entry is not None:
+            # 内容は変わっていないので、保存済みのJSONをそのまま使う
+            self.not_modified += 1
+            touch_cache_entry(file_code, now)
+            return json.loads(entry["body"]), False
+
+        if response.status_code != 200:
+            print(f"API Error: {response.status_code}")
+            return None, False
+
+        save_cache_entry(
+            file_code,
+            now,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            response.text,
+        )
+        return response.json(), False
+
+    def stats(self):
+        """ヒット・ミスの回数を返す"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+# -----------------------------------------------------------
+# 地域リスト(area.json)の更新確認
+# -----------------------------------------------------------
+def build_area_tree(data):
+    """area.json から [(center_code, center_name, [(code, name), ...]), ...] を作る"""
+    area_tree = []
+    for center_code, center in data["centers"].items():
+        children = [
+            (code, data["offices"][code]["name"])
+            for code in center["children"]
+            if code in data["offices"]
+        ]
+        if children:
+            area_tree.append((center_code, center["name"], children))
+    return area_tree
+
+def office_file_codes(data):
+    """area.json の全 offices の予報ファイルコード（同じファイルを見る地域は1つにまとめる）"""
+    return sorted({URL_EXCEPTIONS.get(code, code) for code in data["offices"]})
+
+def refresh_area_tree(area_url=AREA_URL):
+    """area.json が変わっていればDBの階層を更新して返す。変わっていなければNone"""
+    headers = {}
+    etag = get_meta("area_etag")
+    last_modified = get_meta("area_last_modified")
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    response = requests.get(area_url, headers=headers, timeout=10)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+
+    # ETagが付かない場合もあるので、中身のハッシュでも版を見分ける
+    digest = hashlib.sha256(response.content).hexdigest()
+    meta = {
+        "area_etag": response.headers.get("ETag"),
+        "area_last_modified": response.headers.get("Last-Modified"),
+        "area_hash": digest,
+    }
+    if digest == get_meta("area_hash"):
+        set_meta(meta)
+        return None
+
+    area_tree = build_area_tree(response.json())
+    save_area_tree(area_tree)
+    set_meta(meta)
+    return area_tree
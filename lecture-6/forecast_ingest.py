@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import time
+
+import requests
+
+import weather_db
+from weather_db import init_db, save_area_tree, save_all_forecasts_to_db
+from forecast_cache import AREA_URL, FORECAST_URL_BASE, ForecastCache, build_area_tree, office_file_codes
+from forecast_parser import parse_office_file
+
+# -----------------------------------------------------------
+# 定数定義
+# -----------------------------------------------------------
+DEFAULT_BATCH_FILES = 20  # 何ファイルごとにDBへ書き込むか
+
+# -----------------------------------------------------------
+# 取り込み処理（GUIなしで動く）
+# -----------------------------------------------------------
+def load_area_data(source=AREA_URL):
+    """area.json をURL、またはローカルのファイルパスから読み込む"""
+    if source.startswith(("http://", "https://")):
+        response = requests.get(source, timeout=10)
+        response.raise_for_status()
+        return response.json()
+    with open(source, encoding="utf-8") as f:
+        return json.load(f)
+
+def iter_json_files(paths):
+    """ファイル・ディレクトリの一覧から予報JSONを1つずつ読み込んで返す"""
+    for path in paths:
+        if os.path.isdir(path):
+            # 同じディレクトリに置いた area.json は予報ではないので飛ばす
+            names = sorted(n for n in os.listdir(path) if n.endswith(".json") and n != "area.json")
+            files = [os.path.join(path, n) for n in names]
+        else:
+            files = [path]
+
+        for file_path in files:
+            # ファイル名 (例: 014100.json) をファイルコードとして使う
+            file_code = os.path.splitext(os.path.basename(file_path))[0]
+            try:
+                with open(file_path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as err:
+                print(f"  読込失敗: {file_path} ({err})")
+                continue
+            yield file_code, data
+
+def iter_remote_files(file_codes, cache=None):
+    """気象庁から予報JSONを1つずつ取得して返す（キャッシュと条件付きGETを使う）"""
+    if cache is None:
+        cache = ForecastCache()
+    for file_code in file_codes:
+        try:
+            data, _ = cache.get(file_code)
+        except requests.RequestException as err:
+            print(f"  取得失敗: {file_code} ({err})")
+            continue
+        if data is not None:
+            yield file_code, data
+
+def ingest(sources, batch_files=DEFAULT_BATCH_FILES):
+    """(file_code, data) を順に解析してDBへ保存し、件数と速度を返す
+
+    全ファイルをメモリに溜めず、batch_files ごとに1トランザクションで書き込む。
+    """
+    started = time.perf_counter()
+    files = rows = 0
+    batch = {}
+    batch_count = 0
+    failed = []
+
+    for file_code, data in sources:
+        try:
+            forecasts_by_area = parse_office_file(data, file_code)
+        except (IndexError, KeyError, TypeError) as err:
+            failed.append((file_code, str(err)))
+            continue
+
+        batch.update(forecasts_by_area)
+        batch_count += 1
+        files += 1
+        rows += sum(len(v) for v in forecasts_by_area.values())
+
+        if batch_count >= batch_files:
+            save_all_forecasts_to_db(batch)
+            batch, batch_count = {}, 0
+
+    if batch:
+        save_all_forecasts_to_db(batch)
+
+    elapsed = time.perf_counter() - started
+    result = {
+        "files": files,
+        "rows": rows,
+        "failed": failed,
+        "elapsed": elapsed,
+        "rows_per_sec": rows / elapsed if elapsed > 0 else 0.0,
+    }
+    print(f"取り込み完了: {files} ファイル / {rows} 行 / {elapsed:.2f} 秒 ({result['rows_per_sec']:.0f} 行/秒)")
+    for file_code, error in failed:
+        print(f"  失敗: {file_code} ({error})")
+    return result
+
+# -----------------------------------------------------------
+# コマンドライン（cronなどから実行する）
+# -----------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="気象庁の予報JSONを解析してDBに取り込む")
+    parser.add_argument("paths", nargs="*", help="予報JSONファイル、またはそれが入ったディレクトリ")
+    parser.add_argument("--fetch", nargs="+", metavar="CODE", default=[], help="気象庁から取得するファイルコード")
+    parser.add_argument("--all", action="store_true", help="area.json の全 offices の予報を取得する")
+    parser.add_argument("--area-url", default=AREA_URL, help="area.json のURL（ローカルのファイルパスも可）")
+    parser.add_argument("--base-url", default=FORECAST_URL_BASE, help="forecast/{code}.json の置き場所")
+    parser.add_argument("--db", default=weather_db.DB_NAME)
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH_FILES, help="1トランザクションにまとめるファイル数")
+    args = parser.parse_args()
+
+    if not args.paths and not args.fetch and not args.all:
+        parser.error("ファイルかディレクトリ、または --fetch / --all を指定してください")
+
+    weather_db.DB_NAME = args.db
+    init_db()
+
+    # 閲覧専用モードのアプリはDBの地域リストだけでサイドバーを作るので、予報と一緒に保存しておく
+    area_data = None
+    try:
+        area_data = load_area_data(args.area_url)
+    except (OSError, ValueError, requests.RequestException) as err:
+        print(f"地域リスト読込失敗: {args.area_url} ({err})")
+    if area_data is not None:
+        area_tree = build_area_tree(area_data)
+        save_area_tree(area_tree)
+        print(f"地域リスト保存: {len(area_tree)} 地方 / {sum(len(c) for _, _, c in area_tree)} 地域")
+    elif args.all:
+        parser.exit(1, "Error: area.json が読めないため --all の取得先が分かりません\n")
+
+    fetch_codes = list(args.fetch)
+    if args.all:
+        fetch_codes += [code for code in office_file_codes(area_data) if code not in fetch_codes]
+
+    if args.paths:
+        ingest(iter_json_files(args.paths), args.batch)
+    if fetch_codes:
+        ingest(iter_remote_files(fetch_codes, ForecastCache(args.base_url)), args.batch)
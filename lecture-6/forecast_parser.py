@@ -0,0 +1,65 @@
+from forecast_cache import URL_EXCEPTIONS
+
+# -----------------------------------------------------------
+# 気象庁の予報JSONの解析
+# -----------------------------------------------------------
+def get_icon_name_for_db(text):
+    """DB保存用に天気の文字列からアイコン識別子を返す（簡易実装）"""
+    if "晴" in text: return "sunny"
+    elif "雨" in text: return "rainy"
+    elif "曇" in text: return "cloudy"
+    elif "雪" in text: return "snowy"
+    else: return "other"
+
+def parse_forecast_file(data):
+    """予報JSON1ファイル分を解析し、{area_code: 予報リスト} を返す
+
+    1つのファイルには同じ府県予報区の全エリアが入っているので、
+    クリックされたエリアだけでなく全エリア分をまとめて整形する。
+    """
+    time_series = data[0]["timeSeries"][0]
+    dates = time_series["timeDefines"]
+
+    # 気温取得（エリア構成が違う場合があるので、これまで通り最初の地点の値を使う）
+    temps_min, temps_max = [], []
+    try:
+        temp_series = data[0]["timeSeries"][1]
+        temp_area = temp_series["areas"][0]
+        temps_min = temp_area.get("tempsMin", [])
+        temps_max = temp_area.get("tempsMax", [])
+    except (IndexError, KeyError, AttributeError): pass
+
+    result = {}
+    for area in time_series["areas"]:
+        forecast_data_list = []
+        for i, (date_str, weather_text) in enumerate(zip(dates, area["weathers"])):
+            date_val = date_str[:10]
+            min_t = temps_min[i] if i < len(temps_min) and temps_min[i] is not None else "-"
+            max_t = temps_max[i] if i < len(temps_max) and temps_max[i] is not None else "-"
+
+            forecast_data_list.append({
+                "date": date_val,
+                "weather": weather_text,
+                "min": min_t,
+                "max": max_t,
+                "icon": get_icon_name_for_db(weather_text)
+            })
+        result[area["area"]["code"]] = forecast_data_list
+
+    return result
+
+def parse_office_file(data, file_code):
+    """予報JSONを解析し、このファイルを見る地域コードの分も補って返す
+
+    地域コード(例: 130000)や URL_EXCEPTIONS の地域(例: 014030)はファイル内の
+    エリアコードと一致しないことがあるので、その場合は先頭エリアの予報を使う。
+    """
+    forecasts_by_area = parse_forecast_file(data)
+    if not forecasts_by_area:
+        return forecasts_by_area
+
+    first_area = next(iter(forecasts_by_area.values()))
+    office_codes = [file_code] + [code for code, parent in URL_EXCEPTIONS.items() if parent == file_code]
+    for code in office_codes:
+        forecasts_by_area.setdefault(code, first_area)
+    return forecasts_by_area
@@ -0,0 +1,162 @@
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import weather_db
+from weather_db import init_db, save_area_tree, save_all_forecasts_to_db, save_cache_entries
+from forecast_cache import AREA_URL, FORECAST_URL_BASE, build_area_tree, office_file_codes
+from forecast_parser import parse_office_file
+
+# -----------------------------------------------------------
+# 定数定義
+# -----------------------------------------------------------
+DEFAULT_WORKERS = 8      # 同時にダウンロードする数
+DEFAULT_RATE = 10.0      # 1ホストあたりの最大リクエスト数/秒
+
+# -----------------------------------------------------------
+# ホストごとのレート制限
+# -----------------------------------------------------------
+class HostRateLimiter:
+    """同じホストへのリクエスト間隔を一定以上あける"""
+
+    def __init__(self, rate_per_sec):
+        self.interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self.next_time = {}  # ホスト名 -> 次に送ってよい時刻
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            send_at = max(now, self.next_time.get(host, now))
+            self.next_time[host] = send_at + self.interval
+        if send_at > now:
+            time.sleep(send_at - now)
+
+# -----------------------------------------------------------
+# 一括プリフェッチ
+# -----------------------------------------------------------
+def percentile(values, p):
+    """p(0-100) パーセンタイルを返す"""
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+def prefetch_all(area_url=AREA_URL, base_url=FORECAST_URL_BASE,
+                 workers=DEFAULT_WORKERS, rate=DEFAULT_RATE):
+    """area.json の全 offices の予報を並列に取得してDBへまとめて保存する"""
+    started = time.perf_counter()
+
+    # Keep-Aliveの接続を全スレッドで共有する（プールの大きさはワーカー数に合わせる）
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    limiter = HostRateLimiter(rate)
+
+    limiter.wait(area_url)
+    area_response = session.get(area_url, timeout=10)
+    area_response.raise_for_status()
+    area_data = area_response.json()
+    total_bytes = len(area_response.content)
+
+    # URL_EXCEPTIONSで同じファイルを見る地域は1回だけダウンロードする
+    file_codes = office_file_codes(area_data)
+    print(f"Prefetch: {len(file_codes)} files ({workers} workers, {rate}/sec per host)")
+
+    def fetch_one(file_code):
+        url = f"{base_url}{file_code}.json"
+        limiter.wait(url)
+        t0 = time.perf_counter()
+        try:
+            response = session.get(url, timeout=10)
+        except requests.RequestException as err:
+            return file_code, None, time.perf_counter() - t0, 0, str(err)
+        latency = time.perf_counter() - t0
+        if response.status_code != 200:
+            return file_code, None, latency, len(response.content), f"status {response.status_code}"
+        return file_code, response, latency, len(response.content), None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(fetch_one, file_codes))
+
+    # 解析して、全エリア分をまとめて保存
+    forecasts_by_area = {}
+    cache_rows = []
+    latencies = []
+    failed = []
+    fetched_at = time.time()
+    for file_code, response, latency, size, error in results:
+        latencies.append(latency)
+        total_bytes += size
+        if error is not None:
+            failed.append((file_code, error))
+            continue
+        try:
+            # ファイル内に同じコードのエリアがない地域は、クリック時と同じく先頭エリアで補う
+            forecasts_by_area.update(parse_office_file(response.json(), file_code))
+        except (ValueError, IndexError, KeyError) as err:
+            failed.append((file_code, f"parse error: {err}"))
+            continue
+        cache_rows.append((
+            file_code,
+            fetched_at,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            response.text,
+        ))
+
+    save_area_tree(build_area_tree(area_data))
+    save_all_forecasts_to_db(forecasts_by_area, fetched_at)
+    save_cache_entries(cache_rows)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        "files": len(file_codes),
+        "ok": len(cache_rows),
+        "failed": failed,
+        "areas": len(forecasts_by_area),
+        "elapsed": elapsed,
+        "bytes": total_bytes,
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+    }
+    print_report(report)
+    return report
+
+def print_report(report):
+    """プリフェッチ結果を表示する"""
+    print("-" * 50)
+    print(f"ファイル数    : {report['ok']} / {report['files']} 件成功")
+    print(f"保存エリア数  : {report['areas']}")
+    print(f"所要時間      : {report['elapsed']:.2f} 秒")
+    print(f"転送量        : {report['bytes'] / 1024:.1f} KB")
+    print(f"レイテンシ    : p50 {report['p50'] * 1000:.0f} ms / "
+          f"p90 {report['p90'] * 1000:.0f} ms / p99 {report['p99'] * 1000:.0f} ms")
+    for file_code, error in report["failed"]:
+        print(f"  失敗: {file_code} ({error})")
+
+# -----------------------------------------------------------
+# コマンドライン
+# -----------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="全国の天気予報をまとめて取得してDBに保存する")
+    parser.add_argument("--area-url", default=AREA_URL, help="area.json のURL")
+    parser.add_argument("--base-url", default=FORECAST_URL_BASE, help="forecast/{code}.json の置き場所")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="1ホストあたりの最大リクエスト数/秒")
+    parser.add_argument("--db", default=weather_db.DB_NAME)
+    args = parser.parse_args()
+
+    weather_db.DB_NAME = args.db
+    init_db()
+    prefetch_all(args.area_url, args.base_url, args.workers, args.rate)
@@ -1,111 +1,21 @@
-import flet as ft
-import requests
+import asyncio
 import sqlite3
-import os
+import sys
 
-# -----------------------------------------------------------
-# 定数定義
-# -----------------------------------------------------------
-AREA_URL = "http://www.jma.go.jp/bosai/common/const/area.json"
-FORECAST_URL_BASE = "https://www.jma.go.jp/bosai/forecast/data/forecast/"
-DB_NAME = "weather.db"
+import flet as ft
 
-# 例外的なURL対応
-URL_EXCEPTIONS = {
-    "014030": "014100",  # 十勝 -> 釧路
-    "460040": "460100",  # 奄美 -> 鹿児島
-}
+import weather_db
+from weather_db import init_db, save_all_forecasts_to_db, get_forecasts_from_db, load_area_tree
+from forecast_cache import ForecastCache, URL_EXCEPTIONS, refresh_area_tree
+from forecast_parser import parse_office_file
+from forecast_prefetch import prefetch_all
 
 # -----------------------------------------------------------
-# データベース処理（SQLite）
+# 定数定義
 # -----------------------------------------------------------
-def init_db():
-    """DBとテーブルの初期化"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # 1. エリア管理テーブル
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS areas (
-            area_code TEXT PRIMARY KEY,
-            area_name TEXT
-        )
-    """)
-    
-    # 2. 天気予報テーブル
-    # area_code と target_date の組み合わせを一意(PK)とする
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS forecasts (
-            area_code TEXT,
-            target_date TEXT,
-            weather_text TEXT,
-            min_temp TEXT,
-            max_temp TEXT,
-            icon_name TEXT,
-            PRIMARY KEY (area_code, target_date)
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def save_area_to_db(code, name):
-    """エリア情報をDBに保存"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    # 重複していれば無視(INSERT OR IGNORE)
-    cursor.execute("INSERT OR IGNORE INTO areas (area_code, area_name) VALUES (?, ?)", (code, name))
-    conn.commit()
-    conn.close()
-
-def save_forecasts_to_db(area_code, forecast_list):
-    """取得した予報リストをDBに保存（Upsert:あれば更新、なければ挿入）"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    for item in forecast_list:
-        # REPLACE INTO は PKが重複する場合、古い行を削除して新しい行を入れる
-        cursor.execute("""
-            REPLACE INTO forecasts (area_code, target_date, weather_text, min_temp, max_temp, icon_name)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            area_code,
-            item["date"],
-            item["weather"],
-            item["min"],
-            item["max"],
-            item["icon"]
-        ))
-    
-    conn.commit()
-    conn.close()
-
-def get_forecasts_from_db(area_code):
-    """DBから特定の地域の予報を取得する"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # 日付順に取得
-    cursor.execute("""
-        SELECT target_date, weather_text, min_temp, max_temp, icon_name 
-        FROM forecasts 
-        WHERE area_code = ? 
-        ORDER BY target_date ASC
-    """, (area_code,))
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
-    # 辞書リストに変換して返す
-    result = []
-    for row in rows:
-        result.append({
-            "date": row[0],
-            "weather": row[1],
-            "min": row[2],
-            "max": row[3],
-            "icon": row[4]
-        })
-    return result
+# 「python weather_app.py --viewer」で起動すると、DBを表示するだけの閲覧専用モードになる
+# （データの取り込みは cron などから forecast_ingest.py で行う）
+VIEWER_MODE = "--viewer" in sys.argv
 
 # -----------------------------------------------------------
 # UI補助関数
@@ -120,22 +30,74 @@ def get_weather_icon_info(text):
     elif "雪" in text: return ft.Icons.AC_UNIT, ft.Colors.CYAN
     else: return ft.Icons.WB_CLOUDY_OUTLINED, ft.Colors.GREY_400
 
-def get_icon_name_for_db(text):
-    """DB保存用に天気の文字列からアイコン識別子を返す（簡易実装）"""
-    if "晴" in text: return "sunny"
-    elif "雨" in text: return "rainy"
-    elif "曇" in text: return "cloudy"
-    elif "雪" in text: return "snowy"
-    else: return "other"
+class WeatherCard(ft.Container):
+    """1日分の予報カード。値が変わった部品だけを書き換えて使い回す"""
+    def __init__(self):
+        super().__init__()
+        self.date_text = ft.Text("", weight="bold", size=14)
+        self.icon = ft.Icon(ft.Icons.WB_CLOUDY_OUTLINED, size=48, color=ft.Colors.GREY_400)
+        self.weather_text = ft.Text("", size=12, text_align=ft.TextAlign.CENTER)
+        self.min_text = ft.Text("", color=ft.Colors.BLUE)
+        self.max_text = ft.Text("", color=ft.Colors.RED)
+
+        self.content = ft.Column(
+            [
+                self.date_text,
+                self.icon,
+                self.weather_text,
+                ft.Container(height=10),
+                ft.Row(
+                    [self.min_text, ft.Text(" / "), self.max_text],
+                    alignment=ft.MainAxisAlignment.CENTER
+                )
+            ],
+            alignment=ft.MainAxisAlignment.CENTER,
+            horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+            spacing=5
+        )
+        self.bgcolor = ft.Colors.WHITE
+        self.border_radius = 10
+        self.padding = 15
+        self.shadow = ft.BoxShadow(blur_radius=5, color=ft.Colors.GREY_300)
+
+    def set_forecast(self, item):
+        """予報1件を反映する。何か変わったら True を返す"""
+        # DBから取り出した天気の文字を使ってアイコンを決める
+        icon, icon_color = get_weather_icon_info(item["weather"])
+        new_values = [
+            (self.date_text, "value", item["date"]),
+            (self.icon, "name", icon),
+            (self.icon, "color", icon_color),
+            (self.weather_text, "value", item["weather"]),
+            (self.min_text, "value", f"{item['min']}°C"),
+            (self.max_text, "value", f"{item['max']}°C"),
+        ]
+
+        changed = False
+        for control, attr, value in new_values:
+            if getattr(control, attr) != value:
+                setattr(control, attr, value)
+                changed = True
+        return changed
 
 # -----------------------------------------------------------
 # メインアプリ
 # -----------------------------------------------------------
 def main(page: ft.Page):
-    # アプリ起動時にDB初期化
-    init_db()
-
-    page.title = "天気予報アプリ (DB版)"
+    if VIEWER_MODE:
+        # 閲覧専用モード：DBは読み取り専用で開き、通信もしない
+        weather_db.READ_ONLY = True
+    else:
+        # アプリ起動時にDB初期化
+        init_db()
+    # 予報JSONのキャッシュ（ファイルコード単位）
+    forecast_cache = ForecastCache()
+
+    # 「python weather_app.py --prefetch」で起動したら、全国の予報を裏でまとめて取得する
+    if "--prefetch" in sys.argv and not VIEWER_MODE:
+        page.run_thread(prefetch_all)
+
+    page.title = "天気予報アプリ (DB版・閲覧専用)" if VIEWER_MODE else "天気予報アプリ (DB版)"
     page.padding = 0
     page.theme_mode = ft.ThemeMode.LIGHT
     page.window_width = 1000
@@ -172,65 +134,40 @@ def main(page: ft.Page):
     # -------------------------------------------------------
     # ロジック：天気情報の取得・保存・表示
     # -------------------------------------------------------
-    def display_weather(e):
-        target_code = e.control.data
-        region_name = e.control.title.value
-        
-        weather_grid.controls.clear()
-        message_area.content = ft.Text(f"{region_name} のデータを更新中...", color=ft.Colors.BLACK)
-        page.update()
+    # 実行中の読み込みタスク（別の地域がクリックされたらキャンセルする）
+    current_load = {"future": None, "seq": 0}
+
+    def read_forecasts(target_code):
+        """DBから予報を読む（DBがない・未初期化のときは空リスト）"""
+        try:
+            return get_forecasts_from_db(target_code)
+        except sqlite3.OperationalError as err:
+            print(f"DB Error: {err}")
+            return []
+
+    def fetch_and_store(target_code, region_name):
+        """通信・解析・DB保存をまとめて行う（ワーカースレッドで実行）"""
+        if VIEWER_MODE:
+            # 閲覧専用モードでは取り込みは forecast_ingest.py に任せ、DBを読むだけ
+            return read_forecasts(target_code)
 
         try:
-            # 1. APIから最新データを取得
+            # 1. キャッシュ経由で予報JSONを取得（発表間隔内なら通信しない）
             file_code = URL_EXCEPTIONS.get(target_code, target_code)
-            url = f"{FORECAST_URL_BASE}{file_code}.json"
-            print(f"API Fetching: {url}") # Log
-
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                
-                # エリア特定
-                time_series = data[0]["timeSeries"][0]
-                dates = time_series["timeDefines"]
-                
-                target_area = None
-                for area in time_series["areas"]:
-                    if area["area"]["code"] == target_code:
-                        target_area = area
-                        break
-                if target_area is None: target_area = time_series["areas"][0]
-
-                weathers = target_area["weathers"]
-
-                # 気温取得
-                temps_min, temps_max = [], []
-                try:
-                    temp_series = data[0]["timeSeries"][1]
-                    temp_area = temp_series["areas"][0]
-                    temps_min = temp_area.get("tempsMin", [])
-                    temps_max = temp_area.get("tempsMax", [])
-                except: pass
-
-                # 2. データを整形してリスト化
-                forecast_data_list = []
-                for i, (date_str, weather_text) in enumerate(zip(dates, weathers)):
-                    date_val = date_str[:10]
-                    min_t = temps_min[i] if i < len(temps_min) and temps_min[i] is not None else "-"
-                    max_t = temps_max[i] if i < len(temps_max) and temps_max[i] is not None else "-"
-                    icon_name = get_icon_name_for_db(weather_text)
-
-                    forecast_data_list.append({
-                        "date": date_val,
-                        "weather": weather_text,
-                        "min": min_t,
-                        "max": max_t,
-                        "icon": icon_name
-                    })
-
-                # 3. DBへ保存 (ここが今回の追加機能！)
-                print(f"Saving to DB: {region_name} ({target_code})")
-                save_forecasts_to_db(target_code, forecast_data_list)
+            data, from_cache = forecast_cache.get(file_code)
+
+            if from_cache and get_forecasts_from_db(target_code):
+                # DBに新しいデータがあるので解析・保存も不要
+                print(f"Cache Hit: {file_code} {forecast_cache.stats()}")
+            elif data is not None:
+                # 2. ファイル内の全エリアをまとめて解析
+                # （URL_EXCEPTIONSで同じファイルを見る地域は、次回以降ダウンロードも解析も不要になる）
+                # 見つからなかった地域は先頭エリアのデータで補われる
+                forecasts_by_area = parse_office_file(data, file_code)
+
+                # 3. DBへ保存（全エリア分を1トランザクションで）
+                print(f"Saving to DB: {region_name} ({target_code}) + {len(forecasts_by_area) - 1} areas")
+                save_all_forecasts_to_db(forecasts_by_area)
 
             else:
                 print("API Error, trying to load from DB...")
@@ -239,104 +176,161 @@ def main(page: ft.Page):
             print(f"Update Error: {err}")
             # エラーが出ても、DBに古いデータがあればそれを表示するなどの工夫が可能
 
-        # 4. DBからデータを読み込んで表示 (JSONから直接表示しない)
+        # 4. DBからデータを読み込む (JSONから直接表示しない)
         # これにより「JSON -> DB -> View」の流れを実現
-        db_forecasts = get_forecasts_from_db(target_code)
-        
+        return read_forecasts(target_code)
+
+    async def load_weather(target_code, region_name, seq):
+        """通信はスレッドに任せ、結果が届いたら画面を更新する"""
+        try:
+            db_forecasts = await asyncio.to_thread(fetch_and_store, target_code, region_name)
+        except asyncio.CancelledError:
+            print(f"Cancelled: {region_name} ({target_code})")
+            return
+
+        # 待っている間に別の地域がクリックされていたら、古い結果は捨てる
+        if seq != current_load["seq"]:
+            return
+
+        show_forecasts(db_forecasts)
+
+    def display_weather(e):
+        target_code = e.control.data
+        region_name = e.control.title.value
+
+        # 前の地域の読み込みが終わっていなければキャンセル
+        if current_load["future"] is not None and not current_load["future"].done():
+            current_load["future"].cancel()
+        current_load["seq"] += 1
+
+        # カードは消さずに残しておき、結果が届いたら差分だけ書き換える
+        message_area.content = ft.Text(f"{region_name} のデータを更新中...", color=ft.Colors.BLACK)
+        message_area.update()
+
+        # イベントハンドラはすぐに返し、UIを固めない
+        current_load["future"] = page.run_task(load_weather, target_code, region_name, current_load["seq"])
+
+    # 一度作ったカードは捨てずに使い回す
+    card_pool = []
+
+    def show_forecasts(db_forecasts):
+        """DBから読み込んだ予報をカードに反映する（変わった部分だけ送る）"""
         if not db_forecasts:
             message_area.content = ft.Text("データの取得に失敗し、保存されたデータもありません。", color=ft.Colors.RED)
+            weather_grid.controls = []
             page.update()
             return
 
         message_area.content = ft.Container() # メッセージ消去
-
-        # カード作成 (DBのデータを使用)
-        for item in db_forecasts:
-            # DBから取り出した天気の文字を使ってアイコンを決める
-            icon, icon_color = get_weather_icon_info(item["weather"])
-            
-            card = ft.Container(
-                content=ft.Column(
-                    [
-                        ft.Text(item["date"], weight="bold", size=14),
-                        ft.Icon(icon, size=48, color=icon_color),
-                        ft.Text(item["weather"], size=12, text_align=ft.TextAlign.CENTER),
-                        ft.Container(height=10),
-                        ft.Row(
-                            [
-                                ft.Text(f"{item['min']}°C", color=ft.Colors.BLUE),
-                                ft.Text(" / "),
-                                ft.Text(f"{item['max']}°C", color=ft.Colors.RED),
-                            ],
-                            alignment=ft.MainAxisAlignment.CENTER
-                        )
-                    ],
-                    alignment=ft.MainAxisAlignment.CENTER,
-                    horizontal_alignment=ft.CrossAxisAlignment.CENTER,
-                    spacing=5
-                ),
-                bgcolor=ft.Colors.WHITE, border_radius=10, padding=15,
-                shadow=ft.BoxShadow(blur_radius=5, color=ft.Colors.GREY_300),
-            )
-            weather_grid.controls.append(card)
-        
-        page.update()
+        message_area.update()
+
+        # 足りない分だけ新しくカードを作る
+        while len(card_pool) < len(db_forecasts):
+            card_pool.append(WeatherCard())
+
+        changed_cards = []
+        for card, item in zip(card_pool, db_forecasts):
+            if card.set_forecast(item):
+                changed_cards.append(card)
+
+        cards = card_pool[:len(db_forecasts)]
+        if len(weather_grid.controls) != len(cards):
+            # 枚数が変わったときだけグリッドごと更新
+            weather_grid.controls = cards
+            weather_grid.update()
+        else:
+            # 枚数が同じなら、中身が変わったカードだけ更新
+            for card in changed_cards:
+                card.update()
 
     # -------------------------------------------------------
     # 地域リスト読込
     # -------------------------------------------------------
-    def load_area_list():
+    def build_center_tiles(children):
+        """地方の下の地域ボタンを作る"""
+        return [
+            ft.ListTile(
+                title=ft.Text(name, color=ft.Colors.GREY_200, size=13),
+                data=code,
+                on_click=display_weather
+            )
+            for code, name in children
+        ]
+
+    def expand_center(e):
+        """地方が初めて開かれたときだけ、中の地域ボタンを作る"""
+        center_tile = e.control
+        # data には未作成の子リストを入れておき、作成済みなら None にする
+        if e.data != "true" or center_tile.data is None:
+            return
+        center_tile.controls = build_center_tiles(center_tile.data)
+        center_tile.data = None
+        center_tile.update()
+
+    def build_sidebar(area_tree):
+        """地方と地域の階層からサイドバーを作る（地域ボタンは開いたときに作る）"""
+        sidebar_items = [
+            ft.Text("地域を選択", color=ft.Colors.WHITE, weight="bold", size=16),
+            ft.Divider(color=ft.Colors.GREY_600)
+        ]
+
+        for center_code, center_name, children in area_tree:
+            if not children:
+                continue
+
+            sidebar_items.append(
+                ft.ExpansionTile(
+                    title=ft.Text(center_name, color=ft.Colors.WHITE),
+                    # 開くまでは軽いプレースホルダーだけを送る
+                    controls=[ft.Text("読み込み中...", color=ft.Colors.GREY_400, size=12)],
+                    data=children,
+                    on_change=expand_center,
+                    icon_color=ft.Colors.WHITE,
+                    collapsed_icon_color=ft.Colors.WHITE,
+                    text_color=ft.Colors.WHITE,
+                    collapsed_text_color=ft.Colors.WHITE
+                )
+            )
+
+        sidebar_column.controls = sidebar_items
+        page.update()
+
+    async def load_area_list():
+        # 1. DBに保存済みの階層があれば、通信を待たずにすぐサイドバーを作る
         try:
-            print("地域リスト取得中...")
-            response = requests.get(AREA_URL)
-            data = response.json()
-            
-            sidebar_items = [
-                ft.Text("地域を選択", color=ft.Colors.WHITE, weight="bold", size=16),
-                ft.Divider(color=ft.Colors.GREY_600)
-            ]
-
-            for center in data["centers"].values():
-                children_codes = center["children"]
-                pref_tiles = []
-                
-                for code in children_codes:
-                    if code in data["offices"]:
-                        office = data["offices"][code]
-                        name = office["name"]
-                        
-                        # (オプション) エリア情報をDBに保存
-                        save_area_to_db(code, name)
-
-                        tile = ft.ListTile(
-                            title=ft.Text(name, color=ft.Colors.GREY_200, size=13),
-                            data=code,
-                            on_click=display_weather
-                        )
-                        pref_tiles.append(tile)
-                
-                if pref_tiles:
-                    sidebar_items.append(
-                        ft.ExpansionTile(
-                            title=ft.Text(center["name"], color=ft.Colors.WHITE),
-                            controls=pref_tiles,
-                            icon_color=ft.Colors.WHITE,
-                            collapsed_icon_color=ft.Colors.WHITE,
-                            text_color=ft.Colors.WHITE,
-                            collapsed_text_color=ft.Colors.WHITE
-                        )
-                    )
-            
-            sidebar_column.controls = sidebar_items
-            page.update()
-            print("リスト作成完了")
+            area_tree = await asyncio.to_thread(load_area_tree)
+        except sqlite3.OperationalError as err:
+            # 閲覧専用モードでDBがない・まだ取り込まれていないとき
+            print(f"地域リスト読込失敗 (DB): {err}")
+            area_tree = []
+        if area_tree:
+            build_sidebar(area_tree)
+            print("リスト作成完了 (DB)")
+
+        if VIEWER_MODE:
+            if not area_tree:
+                sidebar_column.controls = [ft.Text("DBに地域リストがありません", color="red")]
+                page.update()
+            return
+
+        # 2. area.json は裏で確認し、版が変わっていたときだけ作り直す
+        try:
+            print("地域リスト更新確認中...")
+            new_tree = await asyncio.to_thread(refresh_area_tree)
+            if new_tree is not None:
+                build_sidebar(new_tree)
+                print("リスト作成完了 (area.json)")
 
         except Exception as err:
-            sidebar_column.controls.append(ft.Text(f"リスト読込失敗: {err}", color="red"))
-            page.update()
+            print(f"地域リスト更新失敗: {err}")
+            if not area_tree:
+                sidebar_column.controls.append(ft.Text(f"リスト読込失敗: {err}", color="red"))
+                page.update()
 
     # アプリ構築
+    sidebar_column.controls.append(ft.Text("地域リスト取得中...", color=ft.Colors.GREY_300))
     page.add(ft.Row([sidebar, main_content], expand=True, spacing=0))
-    load_area_list()
+    # 地域リストはDB→area.jsonの順に裏で読み込み、届いたらサイドバーを作る
+    page.run_task(load_area_list)
 
 ft.app(target=main)
\ No newline at end of file
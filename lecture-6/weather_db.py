@@ -0,0 +1,377 @@
+import argparse
+import sqlite3
+import threading
+import atexit
+import time
+from datetime import datetime
+
+# -----------------------------------------------------------
+# 定数定義
+# -----------------------------------------------------------
+DB_NAME = "weather.db"
+# True にすると読み取り専用で開く（閲覧専用モードのアプリ用）
+READ_ONLY = False
+
+# SQL文は定数にして毎回同じ文字列を渡す
+# (sqlite3 は文字列をキーにプリペアドステートメントをキャッシュするため)
+SQL_UPSERT_AREA = """
+    INSERT INTO areas (area_code, area_name) VALUES (?, ?)
+    ON CONFLICT(area_code) DO UPDATE SET area_name = excluded.area_name
+"""
+SQL_INSERT_CENTER = "INSERT INTO centers (center_code, center_name, sort_order) VALUES (?, ?, ?)"
+SQL_INSERT_CENTER_CHILD = """
+    INSERT INTO center_children (center_code, area_code, sort_order) VALUES (?, ?, ?)
+"""
+SQL_SELECT_AREA_TREE = """
+    SELECT c.center_code, c.center_name, a.area_code, a.area_name
+    FROM centers AS c
+    JOIN center_children AS cc ON cc.center_code = c.center_code
+    JOIN areas AS a ON a.area_code = cc.area_code
+    ORDER BY c.sort_order, cc.sort_order
+"""
+SQL_SELECT_META = "SELECT value FROM meta WHERE key = ?"
+SQL_REPLACE_META = "REPLACE INTO meta (key, value) VALUES (?, ?)"
+SQL_REPLACE_FORECAST = """
+    REPLACE INTO forecasts (area_code, target_date, weather_text, min_temp, max_temp, icon_name)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+SQL_INSERT_HISTORY = """
+    INSERT OR IGNORE INTO forecast_history
+        (area_code, target_date, fetched_at, fetched_month, weather_text, min_temp, max_temp, icon_name)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_SELECT_HISTORY = """
+    SELECT fetched_at, weather_text, min_temp, max_temp, icon_name
+    FROM forecast_history
+    WHERE area_code = ? AND target_date = ?
+    ORDER BY fetched_at ASC
+"""
+SQL_SELECT_CACHE = """
+    SELECT fetched_at, etag, last_modified, body
+    FROM forecast_cache
+    WHERE file_code = ?
+"""
+SQL_REPLACE_CACHE = """
+    REPLACE INTO forecast_cache (file_code, fetched_at, etag, last_modified, body)
+    VALUES (?, ?, ?, ?, ?)
+"""
+SQL_TOUCH_CACHE = "UPDATE forecast_cache SET fetched_at = ? WHERE file_code = ?"
+SQL_SELECT_FORECASTS = """
+    SELECT target_date, weather_text, min_temp, max_temp, icon_name
+    FROM forecasts
+    WHERE area_code = ?
+    ORDER BY target_date ASC
+"""
+
+# -----------------------------------------------------------
+# 接続管理（スレッドごとに1本の接続を使い回す）
+# -----------------------------------------------------------
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+
+def get_connection():
+    """このスレッド用の接続を返す（なければ作成してPRAGMAを設定）"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+
+    # Fletのイベントハンドラは別スレッドで動くので、スレッドごとに接続を持つ
+    if READ_ONLY:
+        # 取り込み側(forecast_ingest.py)が書き込み中でもWALなら読める
+        conn = sqlite3.connect(f"file:{DB_NAME}?mode=ro", uri=True, timeout=10, cached_statements=256)
+    else:
+        conn = sqlite3.connect(DB_NAME, timeout=10, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")      # 読み込みと書き込みを並行できるようにする
+        conn.execute("PRAGMA synchronous=NORMAL")    # WALならNORMALでも安全。fsync回数を減らす
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-8000")      # 約8MBのページキャッシュ
+
+    _local.conn = conn
+    with _connections_lock:
+        _connections.append(conn)
+    return conn
+
+def close_all_connections():
+    """開いている全ての接続を閉じる（終了時に呼ばれる）"""
+    with _connections_lock:
+        for conn in _connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _connections.clear()
+    _local.__dict__.clear()
+
+atexit.register(close_all_connections)
+
+# -----------------------------------------------------------
+# データベース処理（SQLite）
+# -----------------------------------------------------------
+def init_db():
+    """DBとテーブルの初期化"""
+    conn = get_connection()
+
+    with conn:
+        # 1. エリア管理テーブル
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS areas (
+                area_code TEXT PRIMARY KEY,
+                area_name TEXT
+            )
+        """)
+
+        # 2. 天気予報テーブル
+        # area_code と target_date の組み合わせを一意(PK)とする
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS forecasts (
+                area_code TEXT,
+                target_date TEXT,
+                weather_text TEXT,
+                min_temp TEXT,
+                max_temp TEXT,
+                icon_name TEXT,
+                PRIMARY KEY (area_code, target_date)
+            )
+        """)
+
+        # 2-2. 予報の履歴テーブル（上書きせずに取得ごとに追記する）
+        # 気温は数値型で持ち、fetched_month(YYYY-MM) 単位で古いものを消せるようにする
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS forecast_history (
+                area_code TEXT NOT NULL,
+                target_date TEXT NOT NULL,
+                fetched_at INTEGER NOT NULL,
+                fetched_month TEXT NOT NULL,
+                weather_text TEXT,
+                min_temp INTEGER,
+                max_temp INTEGER,
+                icon_name TEXT,
+                PRIMARY KEY (area_code, target_date, fetched_at)
+            ) WITHOUT ROWID
+        """)
+        # 保存期間を過ぎた月をまとめて消すための索引
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_history_month
+            ON forecast_history (fetched_month)
+        """)
+        # 日付ごとに全地域の予報のぶれを見るための索引（表を読まずに済むよう気温も含める）
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_history_target
+            ON forecast_history (target_date, area_code, fetched_at, min_temp, max_temp)
+        """)
+
+        # 3. 予報JSONのキャッシュ管理テーブル（ファイルコード単位）
+        # fetched_at はUNIX時刻、etag / last_modified は条件付きGET用
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS forecast_cache (
+                file_code TEXT PRIMARY KEY,
+                fetched_at REAL,
+                etag TEXT,
+                last_modified TEXT,
+                body TEXT
+            )
+        """)
+
+        # 4. 地方(センター)と、その下の地域の親子関係（サイドバーをDBだけで作るため）
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS centers (
+                center_code TEXT PRIMARY KEY,
+                center_name TEXT,
+                sort_order INTEGER
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS center_children (
+                center_code TEXT,
+                area_code TEXT,
+                sort_order INTEGER,
+                PRIMARY KEY (center_code, area_code)
+            )
+        """)
+
+        # 5. area.json のETagやハッシュなどを覚えておくテーブル
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        """)
+
+def save_area_tree(area_tree):
+    """地方と地域の階層 [(center_code, center_name, [(code, name), ...]), ...] を保存"""
+    conn = get_connection()
+
+    center_rows, child_rows, area_rows = [], [], []
+    for i, (center_code, center_name, children) in enumerate(area_tree):
+        center_rows.append((center_code, center_name, i))
+        for j, (code, name) in enumerate(children):
+            child_rows.append((center_code, code, j))
+            area_rows.append((code, name))
+
+    # 階層は丸ごと入れ替える（1トランザクションなので途中の状態は見えない）
+    with conn:
+        conn.execute("DELETE FROM centers")
+        conn.execute("DELETE FROM center_children")
+        conn.executemany(SQL_INSERT_CENTER, center_rows)
+        conn.executemany(SQL_INSERT_CENTER_CHILD, child_rows)
+        conn.executemany(SQL_UPSERT_AREA, area_rows)
+
+def load_area_tree():
+    """保存済みの地方と地域の階層を返す（なければ空リスト）"""
+    rows = get_connection().execute(SQL_SELECT_AREA_TREE).fetchall()
+
+    area_tree = []
+    for center_code, center_name, code, name in rows:
+        if not area_tree or area_tree[-1][0] != center_code:
+            area_tree.append((center_code, center_name, []))
+        area_tree[-1][2].append((code, name))
+    return area_tree
+
+def get_meta(key):
+    """メタ情報を返す（なければNone）"""
+    row = get_connection().execute(SQL_SELECT_META, (key,)).fetchone()
+    return row[0] if row else None
+
+def set_meta(values):
+    """メタ情報 {key: value} をまとめて保存"""
+    conn = get_connection()
+    with conn:
+        conn.executemany(SQL_REPLACE_META, list(values.items()))
+
+def to_temp(value):
+    """"12" や "-" などの気温文字列を整数(なければNone)にする"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def save_all_forecasts_to_db(forecasts_by_area, fetched_at=None):
+    """{area_code: 予報リスト} をまとめて1トランザクションで保存
+
+    forecasts には最新の予報を上書きし、forecast_history には取得時刻つきで追記する。
+    """
+    conn = get_connection()
+    if fetched_at is None:
+        fetched_at = time.time()
+    fetched_at = int(fetched_at)
+    fetched_month = datetime.fromtimestamp(fetched_at).strftime("%Y-%m")
+
+    rows = []
+    history_rows = []
+    for area_code, forecast_list in forecasts_by_area.items():
+        for item in forecast_list:
+            rows.append((area_code, item["date"], item["weather"], item["min"], item["max"], item["icon"]))
+            history_rows.append((
+                area_code, item["date"], fetched_at, fetched_month, item["weather"],
+                to_temp(item["min"]), to_temp(item["max"]), item["icon"]
+            ))
+
+    with conn:
+        conn.executemany(SQL_REPLACE_FORECAST, rows)
+        conn.executemany(SQL_INSERT_HISTORY, history_rows)
+
+def get_forecast_history(area_code, target_date):
+    """ある地域・日付の予報が取得のたびにどう変わったかを返す"""
+    rows = get_connection().execute(SQL_SELECT_HISTORY, (area_code, target_date)).fetchall()
+    return [
+        {"fetched_at": row[0], "weather": row[1], "min": row[2], "max": row[3], "icon": row[4]}
+        for row in rows
+    ]
+
+def compact_history(retention_months=12, vacuum=False):
+    """予報履歴の保存期間を過ぎた月を消し、前回と同じ内容の履歴をまとめる"""
+    conn = get_connection()
+
+    # 保存期間の境目の月 (例: 12か月なら、今が2026-10のとき 2025-10 より前を消す)
+    now = datetime.now()
+    month_index = now.year * 12 + now.month - 1 - retention_months
+    cutoff_month = f"{month_index // 12:04d}-{month_index % 12 + 1:02d}"
+
+    with conn:
+        # 1. 古い月はまるごと削除（fetched_month の索引を使う）
+        expired = conn.execute(
+            "DELETE FROM forecast_history WHERE fetched_month < ?", (cutoff_month,)
+        ).rowcount
+
+        # 2. 内容が直前の取得と同じ行は情報がないので削除する
+        duplicated = conn.execute("""
+            DELETE FROM forecast_history
+            WHERE (area_code, target_date, fetched_at) IN (
+                SELECT area_code, target_date, fetched_at FROM (
+                    SELECT area_code, target_date, fetched_at,
+                        LAG(fetched_at) OVER w IS NOT NULL
+                        AND weather_text IS LAG(weather_text) OVER w
+                        AND min_temp IS LAG(min_temp) OVER w
+                        AND max_temp IS LAG(max_temp) OVER w AS same_as_previous
+                    FROM forecast_history
+                    WINDOW w AS (PARTITION BY area_code, target_date ORDER BY fetched_at)
+                )
+                WHERE same_as_previous
+            )
+        """).rowcount
+
+    conn.execute("PRAGMA optimize")
+    if vacuum:
+        conn.execute("VACUUM")
+
+    print(f"履歴の整理: 期限切れ {expired} 行 / 重複 {duplicated} 行を削除 (保存期間: {cutoff_month} 以降)")
+    return expired, duplicated
+
+def get_cache_entry(file_code):
+    """キャッシュ情報を辞書で返す（なければNone）"""
+    row = get_connection().execute(SQL_SELECT_CACHE, (file_code,)).fetchone()
+    if row is None:
+        return None
+    return {"fetched_at": row[0], "etag": row[1], "last_modified": row[2], "body": row[3]}
+
+def save_cache_entry(file_code, fetched_at, etag, last_modified, body):
+    """ダウンロードした予報JSONとヘッダ情報を保存"""
+    conn = get_connection()
+    with conn:
+        conn.execute(SQL_REPLACE_CACHE, (file_code, fetched_at, etag, last_modified, body))
+
+def save_cache_entries(cache_rows):
+    """[(file_code, fetched_at, etag, last_modified, body), ...] をまとめて保存"""
+    conn = get_connection()
+    with conn:
+        conn.executemany(SQL_REPLACE_CACHE, cache_rows)
+
+def touch_cache_entry(file_code, fetched_at):
+    """304 Not Modified のときは取得時刻だけ更新する"""
+    conn = get_connection()
+    with conn:
+        conn.execute(SQL_TOUCH_CACHE, (fetched_at, file_code))
+
+def get_forecasts_from_db(area_code):
+    """DBから特定の地域の予報を取得する"""
+    conn = get_connection()
+
+    # 日付順に取得
+    rows = conn.execute(SQL_SELECT_FORECASTS, (area_code,)).fetchall()
+
+    # 辞書リストに変換して返す
+    result = []
+    for row in rows:
+        result.append({
+            "date": row[0],
+            "weather": row[1],
+            "min": row[2],
+            "max": row[3],
+            "icon": row[4]
+        })
+    return result
+
+# -----------------------------------------------------------
+# コマンドライン（cronなどから履歴の整理を実行する）
+# -----------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="予報履歴の保存期間の管理と整理")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--retention-months", type=int, default=12, help="履歴を残す月数")
+    parser.add_argument("--vacuum", action="store_true", help="削除後にDBファイルを縮める")
+    args = parser.parse_args()
+
+    DB_NAME = args.db
+    init_db()
+    compact_history(args.retention_months, args.vacuum)